@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""Compare ways of reading a GnuCash book without locking it.
+
+Run from the repository root:
+
+    bin/bench_snapshot.py path/to/config.toml
+
+"copy" copies the book into a temporary directory first and reads the copy,
+the other methods read the book through one of the snapshot connections.
+Drop the page cache between runs to measure cold reads.
+"""
+import argparse
+import shutil
+import sys
+import tempfile
+import time
+from dataclasses import (
+    replace,
+)
+from pathlib import (
+    Path,
+)
+from typing import (
+    Callable,
+)
+
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from gntoka import (  # noqa: E402
+    db,
+)
+from gntoka.config import (  # noqa: E402
+    load_configuration,
+)
+from gntoka.types import (  # noqa: E402
+    Configuration,
+    DbContents,
+    Snapshot,
+)
+
+
+def read_book(config: Configuration) -> None:
+    """Read everything an export reads."""
+    con = db.open_connection(config)
+    db_contents = DbContents(
+        account_store=db.get_accounts(con),
+        transaction_store=db.get_transactions(
+            con, config.start_date, config.end_date
+        ),
+    )
+    db.get_splits(con, db_contents)
+    con.close()
+
+
+def read_copy(config: Configuration) -> None:
+    """Copy the book, then read the copy."""
+    with tempfile.TemporaryDirectory() as tmp:
+        copy = Path(tmp) / config.gnucash_db.name
+        shutil.copyfile(config.gnucash_db, copy)
+        read_book(replace(config, gnucash_db=copy))
+
+
+def measure(name: str, read: Callable[[], None], repeat: int) -> None:
+    """Print the fastest time read takes."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        read()
+        timings.append(time.perf_counter() - start)
+    print(f"{name:<10} {min(timings):8.3f} s")
+
+
+def main() -> None:
+    """Run benchmark."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("config")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    config = load_configuration(Path(args.config))
+    measure("copy", lambda: read_copy(config), args.repeat)
+    for snapshot in Snapshot:
+        measure(
+            snapshot.value,
+            lambda: read_book(replace(config, snapshot=snapshot)),
+            args.repeat,
+        )
+
+
+if __name__ == "__main__":
+    main()
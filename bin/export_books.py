@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""Export many GnuCash books at once.
+
+Run from the repository root:
+
+    bin/export_books.py path/to/configs/
+    bin/export_books.py path/to/manifest.txt
+
+A directory exports every *.toml configuration in it. A manifest lists one
+configuration per line, relative to the manifest; empty lines and lines
+starting with "#" are skipped.
+
+Books are exported by a pool of processes, one per core by default. Each
+process loads its own configuration and book. --io-jobs caps how many of them
+read a book or write a journal at the same time, so that a shared disk is not
+read from everywhere at once. A failing book is reported, the others are
+still exported.
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import (
+    Future,
+    ProcessPoolExecutor,
+    as_completed,
+)
+from dataclasses import (
+    dataclass,
+)
+from multiprocessing.synchronize import (
+    Semaphore,
+)
+from pathlib import (
+    Path,
+)
+from typing import (
+    Dict,
+    List,
+    Optional,
+)
+
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from gntoka.config import (  # noqa: E402
+    load_configuration,
+)
+from main import (  # noqa: E402
+    build_account_journal,
+    read_book,
+    write_journal,
+)
+
+
+@dataclass
+class BookResult:
+    """How exporting one book went."""
+
+    config_path: Path
+    seconds: float
+    # The traceback, if the export failed
+    error: Optional[str] = None
+
+
+# Set in every worker by init_worker
+io_slots: Optional[Semaphore] = None
+
+
+def init_worker(slots: Semaphore) -> None:
+    """Remember the semaphore that caps concurrent I/O."""
+    global io_slots
+    io_slots = slots
+
+
+def export_book(config_path: Path) -> BookResult:
+    """Export one book, like main.py does."""
+    assert io_slots is not None
+    start = time.perf_counter()
+    try:
+        config = load_configuration(config_path)
+        with io_slots:
+            db_contents = read_book(config)
+        account_journal = build_account_journal(config, db_contents)
+        with io_slots:
+            write_journal(config, db_contents, account_journal)
+    except Exception:
+        return BookResult(
+            config_path, time.perf_counter() - start, traceback.format_exc()
+        )
+    return BookResult(config_path, time.perf_counter() - start)
+
+
+def read_manifest(path: Path) -> List[Path]:
+    """Read the configuration paths listed in a manifest."""
+    lines = (line.strip() for line in path.read_text().splitlines())
+    return [
+        path.parent / line
+        for line in lines
+        if line and not line.startswith("#")
+    ]
+
+
+def find_configs(path: Path) -> List[Path]:
+    """Find the configurations in a directory or manifest."""
+    if path.is_dir():
+        return sorted(path.glob("*.toml"))
+    return read_manifest(path)
+
+
+def count_cores() -> int:
+    """Count the cores this process may run on."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def get_result(future: "Future[BookResult]", config_path: Path) -> BookResult:
+    """Get the result of an export, even if its worker died."""
+    error = future.exception()
+    if error is None:
+        return future.result()
+    return BookResult(config_path, 0.0, repr(error))
+
+
+def format_result(result: BookResult) -> str:
+    """Describe how exporting a book went."""
+    status = "failed" if result.error else "ok"
+    line = f"{status:6} {result.seconds:8.2f}s {result.config_path}"
+    if result.error:
+        return f"{line}\n{result.error}"
+    return line
+
+
+def export_books(
+    config_paths: List[Path], jobs: int, io_jobs: int
+) -> List[BookResult]:
+    """Export books in a process pool, printing each result."""
+    slots = multiprocessing.BoundedSemaphore(io_jobs)
+    results = []
+    with ProcessPoolExecutor(
+        jobs, initializer=init_worker, initargs=(slots,)
+    ) as executor:
+        futures: Dict["Future[BookResult]", Path] = {
+            executor.submit(export_book, config_path): config_path
+            for config_path in config_paths
+        }
+        for future in as_completed(futures):
+            result = get_result(future, futures[future])
+            print(format_result(result), flush=True)
+            results.append(result)
+    return results
+
+
+def main() -> None:
+    """Export all books."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("configs", type=Path, help="directory or manifest")
+    parser.add_argument("--jobs", type=int, default=count_cores())
+    parser.add_argument(
+        "--io-jobs",
+        type=int,
+        help="how many books to read or write at the same time",
+    )
+    args = parser.parse_args()
+    config_paths = find_configs(args.configs)
+    if not config_paths:
+        sys.exit(f"Expected to find configurations in {args.configs}")
+    jobs = min(args.jobs, len(config_paths))
+    start = time.perf_counter()
+    results = export_books(config_paths, jobs, args.io_jobs or jobs)
+    failed = sum(1 for result in results if result.error)
+    print(
+        f"Exported {len(results) - failed} of {len(results)} books in "
+        f"{time.perf_counter() - start:.2f}s"
+    )
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
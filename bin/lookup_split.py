@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""Find the GnuCash splits a journal row came from.
+
+Run from the repository root, with the provenance_index of an export:
+
+    bin/lookup_split.py journal.idx 1338 2
+
+This prints the guid of the transaction and of every split behind line 2 of
+slip 1338.
+"""
+import argparse
+import sys
+from pathlib import (
+    Path,
+)
+
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from gntoka import (  # noqa: E402
+    provenance,
+)
+
+
+def main() -> None:
+    """Look up a row."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("index", type=Path)
+    parser.add_argument("slip_number", type=int)
+    parser.add_argument("line_number", type=int)
+    args = parser.parse_args()
+    sources = provenance.lookup(args.index, args.slip_number, args.line_number)
+    if not sources:
+        sys.exit(
+            f"Expected to find slip {args.slip_number} line "
+            f"{args.line_number} in {args.index}"
+        )
+    for transaction_guid, split_guid in sources:
+        print(f"transaction {transaction_guid} split {split_guid}")
+
+
+if __name__ == "__main__":
+    main()
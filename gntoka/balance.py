@@ -0,0 +1,92 @@
+"""Check the journal against a trial balance.
+
+The trial balance is computed in SQL from the splits of the exported
+transactions. The journal totals are gathered from the rows as they are
+written, so checking them does not need another pass over the journal.
+"""
+from decimal import (
+    Decimal,
+)
+from typing import (
+    Iterator,
+)
+
+from .serialize import (
+    JournalEntryDict,
+)
+from .types import (
+    BalanceKey,
+    BalanceTotals,
+    TrialBalance,
+)
+
+
+NO_TOTALS = (Decimal(0), Decimal(0))
+
+
+def add_amounts(
+    totals: BalanceTotals, key: BalanceKey, debit: Decimal, credit: Decimal
+) -> None:
+    """Add amounts to the totals of an account."""
+    if not debit and not credit:
+        return
+    total_debit, total_credit = totals.get(key, NO_TOTALS)
+    totals[key] = (total_debit + debit, total_credit + credit)
+
+
+def add_journal_row(totals: BalanceTotals, row: JournalEntryDict) -> None:
+    """Add the amounts of a serialized journal row to the totals."""
+    add_amounts(
+        totals,
+        (row["借方科目コード"], row["借方補助コード"]),
+        Decimal(row["借方金額"]),
+        Decimal(0),
+    )
+    add_amounts(
+        totals,
+        (row["貸方科目コード"], row["貸方補助コード"]),
+        Decimal(0),
+        Decimal(row["貸方金額"]),
+    )
+
+
+def trial_balance_totals(trial_balance: TrialBalance) -> BalanceTotals:
+    """Get the totals of the accounts in a trial balance."""
+    totals: BalanceTotals = {}
+    for balance in trial_balance:
+        add_amounts(
+            totals,
+            (balance.code, balance.supplementary_code),
+            balance.debit,
+            balance.credit,
+        )
+    return totals
+
+
+def find_differences(
+    trial_balance: TrialBalance, journal_totals: BalanceTotals
+) -> Iterator[str]:
+    """Describe every account whose journal totals are off."""
+    expected = trial_balance_totals(trial_balance)
+    for key in sorted(expected.keys() | journal_totals.keys()):
+        debit, credit = expected.get(key, NO_TOTALS)
+        journal_debit, journal_credit = journal_totals.get(key, NO_TOTALS)
+        if (debit, credit) != (journal_debit, journal_credit):
+            code, supplementary_code = key
+            yield (
+                f"{code}-{supplementary_code}: expected debit {debit} and "
+                f"credit {credit}, but the journal has debit "
+                f"{journal_debit} and credit {journal_credit}"
+            )
+
+
+def check_trial_balance(
+    trial_balance: TrialBalance, journal_totals: BalanceTotals
+) -> None:
+    """Check that the journal adds up to the trial balance."""
+    differences = list(find_differences(trial_balance, journal_totals))
+    if differences:
+        raise ValueError(
+            "Expected the journal to match the trial balance: "
+            + "; ".join(differences)
+        )
@@ -0,0 +1,66 @@
+"""Load the TOML configuration of an export."""
+from pathlib import (
+    Path,
+)
+from typing import (
+    Optional,
+)
+
+import toml
+
+from . import (
+    department,
+    tax,
+)
+from .types import (
+    Configuration,
+    Snapshot,
+)
+
+
+def resolve_path(parent: Path, path: Optional[str]) -> Optional[Path]:
+    """Resolve an optional path relative to the configuration file."""
+    return parent / path if path else None
+
+
+def load_configuration(config_path: Path) -> Configuration:
+    """Load a configuration file.
+
+    Paths in the file are relative to the file.
+    """
+    with config_path.open() as fd:
+        config_dict = toml.load(fd)
+    config_path_parent = config_path.parent
+    return Configuration(
+        gnucash_db=Path(config_path_parent / config_dict["gnucash_db"]),
+        journal_out_csv=Path(
+            config_path_parent / config_dict["journal_out_csv"]
+        ),
+        start_date=config_dict["start_date"],
+        end_date=config_dict["end_date"],
+        start_num=config_dict["start_num"],
+        account_links_csv=resolve_path(
+            config_path_parent, config_dict.get("account_links_csv")
+        ),
+        snapshot=Snapshot(config_dict.get("snapshot", Snapshot.NONE.value)),
+        slip_ledger=resolve_path(
+            config_path_parent, config_dict.get("slip_ledger")
+        ),
+        tax_rules=[
+            tax.deserialize_tax_rule(rule)
+            for rule in config_dict.get("tax_rules", [])
+        ],
+        department_rules=[
+            department.deserialize_department_rule(rule)
+            for rule in config_dict.get("department_rules", [])
+        ],
+        aggregate_splits=config_dict.get("aggregate_splits", False),
+        trial_balance_csv=resolve_path(
+            config_path_parent, config_dict.get("trial_balance_csv")
+        ),
+        provenance_index=resolve_path(
+            config_path_parent, config_dict.get("provenance_index")
+        ),
+        shard_rows=config_dict.get("shard_rows"),
+        shard_bytes=config_dict.get("shard_bytes"),
+    )
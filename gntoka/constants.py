@@ -1,2 +1,6 @@
 """Constants used."""
 KAIKEIO_NO_ACCOUNT = "0"
+# The consumption tax calculation method used unless a rule says otherwise
+DEFAULT_CONSUMPTION_TAX_METHOD = "3"
+# The commodity that journal amounts are in
+YEN = "JPY"
@@ -1,15 +1,55 @@
 """CSV related functionality."""
 import csv
+import io
+import os
+import re
+from collections import (
+    deque,
+)
+from concurrent.futures import (
+    Future,
+    ThreadPoolExecutor,
+)
+from itertools import (
+    count,
+    groupby,
+)
+from operator import (
+    itemgetter,
+)
+from pathlib import (
+    Path,
+)
+from typing import (
+    Deque,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+)
 
 from . import (
+    balance,
     serialize,
+    util,
+)
+from .serialize import (
+    JournalEntryDict,
 )
 from .types import (
+    AccountNames,
+    BalanceTotals,
     Configuration,
     JournalEntries,
+    Shard,
+    TrialBalance,
 )
 
 
+# Encoding holds the GIL, so only writing and syncing shards overlap
+WRITER_THREADS = 4
+
+
 class KaikeoDialect(csv.Dialect):
     """CSV dialect for kaikeio."""
 
@@ -20,12 +60,32 @@ class KaikeoDialect(csv.Dialect):
     lineterminator = "\r\n"
 
 
+def serialize_entries(
+    entries: JournalEntries, totals: BalanceTotals
+) -> Iterator[JournalEntryDict]:
+    """Serialize journal entries, adding them to totals."""
+    lengths = util.SjisLengths()
+    for entry in entries:
+        row = serialize.serialize_journal_entry(entry, lengths)
+        balance.add_journal_row(totals, row)
+        yield row
+
+
 # This should handle serialization directly
 def write_journal_entries(
     config: Configuration,
     entries: JournalEntries,
-) -> None:
-    """Write the journal entries."""
+) -> BalanceTotals:
+    """Write the journal entries.
+
+    If the configuration limits the size of the journal, it is split into
+    shards. Return the debit and credit totals of every account written.
+    """
+    totals: BalanceTotals = {}
+    rows = serialize_entries(entries, totals)
+    if config.shard_rows is not None or config.shard_bytes is not None:
+        write_journal_shards(config, rows)
+        return totals
     with config.journal_out_csv.open("w", encoding="shift_jis") as fd:
         writer = csv.DictWriter(
             fd,
@@ -33,5 +93,178 @@ def write_journal_entries(
             dialect=KaikeoDialect,
         )
         writer.writeheader()
-        for entry in entries:
-            writer.writerow(serialize.serialize_journal_entry(entry))
+        writer.writerows(rows)
+    return totals
+
+
+def encode_rows(
+    rows: Iterable[JournalEntryDict], header: bool = False
+) -> bytes:
+    """Encode rows the way write_journal_entries writes them."""
+    fd = io.StringIO()
+    writer = csv.DictWriter(
+        fd, serialize.journal_entry_columns, dialect=KaikeoDialect
+    )
+    if header:
+        writer.writeheader()
+    writer.writerows(rows)
+    return fd.getvalue().encode("shift_jis")
+
+
+def iter_slips(
+    rows: Iterable[JournalEntryDict],
+) -> Iterator[List[JournalEntryDict]]:
+    """Group the rows of each slip."""
+    for _, slip in groupby(rows, key=itemgetter("伝票番号")):
+        yield list(slip)
+
+
+def shard_path(path: Path, number: int) -> Path:
+    """Get the path of a shard, like journal-001.csv."""
+    return path.with_name(f"{path.stem}-{number:03}{path.suffix}")
+
+
+def remove_shards(path: Path) -> None:
+    """Remove the shards of an earlier export, so none are imported twice."""
+    pattern = re.compile(
+        rf"{re.escape(path.stem)}-\d{{3,}}{re.escape(path.suffix)}"
+    )
+    for shard in path.parent.glob(f"{path.stem}-*{path.suffix}"):
+        if pattern.fullmatch(shard.name):
+            shard.unlink()
+
+
+def fits_shard(
+    config: Configuration, shard: Shard, rows: int, size: int
+) -> bool:
+    """Check whether a slip can be added to a shard."""
+    return not shard.rows or (
+        (config.shard_rows is None or shard.rows + rows <= config.shard_rows)
+        and (
+            config.shard_bytes is None
+            or shard.size + size <= config.shard_bytes
+        )
+    )
+
+
+def plan_shards(
+    config: Configuration,
+    slips: Iterable[List[JournalEntryDict]],
+    header: bytes,
+) -> Iterator[Shard]:
+    """Fill shards with encoded slips, keeping every slip whole.
+
+    A slip that exceeds the limits on its own gets a shard of its own.
+    """
+    number = count(1)
+    shard: Optional[Shard] = None
+    for slip in slips:
+        chunk = encode_rows(slip)
+        slip_number = slip[0]["伝票番号"]
+        if shard is None or not fits_shard(
+            config, shard, len(slip), len(chunk)
+        ):
+            if shard is not None:
+                yield shard
+            path = shard_path(config.journal_out_csv, next(number))
+            shard = Shard(path, slip_number, slip_number, size=len(header))
+            shard.chunks.append(header)
+        shard.chunks.append(chunk)
+        shard.last_slip = slip_number
+        shard.rows += len(slip)
+        shard.size += len(chunk)
+    if shard is not None:
+        yield shard
+
+
+def write_shard(shard: Shard) -> Shard:
+    """Write a shard to disk and sync it."""
+    with shard.path.open("wb") as fd:
+        fd.writelines(shard.chunks)
+        fd.flush()
+        os.fsync(fd.fileno())
+    shard.chunks.clear()
+    return shard
+
+
+def write_journal_shards(
+    config: Configuration, rows: Iterable[JournalEntryDict]
+) -> None:
+    """Write rows into shards and list them in a manifest.
+
+    Shards are written by a pool of threads while the next ones are filled.
+    At most WRITER_THREADS shards are held in memory while waiting to be
+    written. Shards of earlier exports are removed first.
+    """
+    remove_shards(config.journal_out_csv)
+    header = encode_rows([], header=True)
+    shards: List[Shard] = []
+    pending: Deque[Future[Shard]] = deque()
+    with ThreadPoolExecutor(WRITER_THREADS) as executor:
+        for shard in plan_shards(config, iter_slips(rows), header):
+            if len(pending) == WRITER_THREADS:
+                shards.append(pending.popleft().result())
+            pending.append(executor.submit(write_shard, shard))
+        shards += [future.result() for future in pending]
+    write_shard_manifest(shard_manifest_path(config.journal_out_csv), shards)
+
+
+def shard_manifest_path(path: Path) -> Path:
+    """Get the path of the manifest listing the shards of a journal."""
+    return path.with_name(f"{path.stem}-manifest{path.suffix}")
+
+
+shard_manifest_columns = ("file", "first_slip", "last_slip", "rows", "bytes")
+
+
+def write_shard_manifest(path: Path, shards: List[Shard]) -> None:
+    """List the shards of a journal, in the order they should be imported."""
+    with path.open("w", encoding="utf-8", newline="") as fd:
+        writer = csv.writer(fd, dialect=KaikeoDialect)
+        writer.writerow(shard_manifest_columns)
+        for shard in shards:
+            writer.writerow(
+                (
+                    shard.path.name,
+                    shard.first_slip,
+                    shard.last_slip,
+                    shard.rows,
+                    shard.size,
+                )
+            )
+
+
+trial_balance_columns = (
+    "科目コード",
+    "科目名称",
+    "補助コード",
+    "補助科目名称",
+    "借方金額",
+    "貸方金額",
+    "残高",
+)
+
+
+def write_trial_balance(path: Path, trial_balance: TrialBalance) -> None:
+    """Write the debit and credit totals of every account."""
+    with path.open("w", encoding="shift_jis") as fd:
+        writer = csv.writer(fd, dialect=KaikeoDialect)
+        writer.writerow(trial_balance_columns)
+        for account in trial_balance:
+            writer.writerow(
+                (
+                    account.code,
+                    account.name or "",
+                    account.supplementary_code,
+                    account.supplementary_name or "",
+                    account.debit,
+                    account.credit,
+                    account.debit - account.credit,
+                )
+            )
+
+
+def read_account_paths(path: Path) -> AccountNames:
+    """Read the GnuCash account paths listed in an account links CSV."""
+    with path.open(encoding="utf-8", newline="") as fd:
+        return [row["name"] for row in csv.DictReader(fd)]
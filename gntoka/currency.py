@@ -0,0 +1,136 @@
+"""Convert transactions in other currencies into yen.
+
+Prices are loaded into a PriceIndex once. Finding the price of a currency on
+a date is then a dictionary lookup followed by a binary search.
+"""
+from bisect import (
+    bisect_right,
+)
+from datetime import (
+    date,
+)
+from decimal import (
+    ROUND_HALF_UP,
+    Decimal,
+)
+from typing import (
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+)
+
+from .constants import (
+    YEN,
+)
+from .types import (
+    DbContents,
+    Price,
+    PriceIndex,
+    Split,
+    TransactionSplit,
+)
+
+
+# Rates are rounded to this, since they end up in the memo
+RATE_PRECISION = Decimal("0.000001")
+
+
+def round_rate(rate: Decimal) -> Decimal:
+    """Round a rate to RATE_PRECISION, without trailing zeros."""
+    rounded = rate.quantize(RATE_PRECISION)
+    if rounded == rounded.to_integral_value():
+        return rounded.quantize(Decimal(1))
+    return rounded.normalize()
+
+
+def yen_rate(price: Price) -> Optional[Tuple[str, Decimal]]:
+    """Get the currency and its rate in yen from a price, if it has one."""
+    if price.currency == YEN and price.commodity != YEN:
+        return price.commodity, round_rate(price.value)
+    if price.commodity == YEN and price.currency != YEN and price.value:
+        return price.currency, round_rate(1 / price.value)
+    return None
+
+
+def build_price_index(prices: Iterable[Price]) -> PriceIndex:
+    """Sort the rates of each currency in yen by date."""
+    by_currency: Dict[str, List[Tuple[date, Decimal]]] = {}
+    for price in prices:
+        currency_rate = yen_rate(price)
+        if currency_rate is not None:
+            currency, rate = currency_rate
+            by_currency.setdefault(currency, []).append((price.date, rate))
+    index: PriceIndex = {}
+    for currency, dated_rates in by_currency.items():
+        dated_rates.sort(key=lambda dated_rate: dated_rate[0])
+        index[currency] = (
+            [posted for posted, _ in dated_rates],
+            [rate for _, rate in dated_rates],
+        )
+    return index
+
+
+def find_rate(
+    prices: PriceIndex, currency: str, on: date
+) -> Tuple[date, Decimal]:
+    """Find the latest price of a currency in yen on or before a date."""
+    dates, rates = prices.get(currency, ([], []))
+    position = bisect_right(dates, on) - 1
+    if position < 0:
+        raise ValueError(
+            f"Expected to find a price of {currency} in {YEN} on or before "
+            f"{on}"
+        )
+    return dates[position], rates[position]
+
+
+def booked_yen(split: Split) -> Optional[Decimal]:
+    """Get the yen amount a split of a yen account was booked with."""
+    if split.account.commodity == YEN:
+        return split.quantity
+    return None
+
+
+def convert_splits(splits: TransactionSplit, rate: Decimal) -> None:
+    """Convert the values of a transaction into yen.
+
+    Splits of yen accounts keep the yen amount they were booked with. The
+    other values are converted with rate. Every value is rounded to the yen.
+    The rounding difference is added to the largest converted value, so that
+    the transaction stays balanced.
+    """
+    booked = [booked_yen(split) for split in splits]
+    converted = [
+        split for split, yen in zip(splits, booked) if yen is None
+    ] or splits
+    for split, yen in zip(splits, booked):
+        split.value = (split.value * rate if yen is None else yen).quantize(
+            Decimal(1), rounding=ROUND_HALF_UP
+        )
+    largest = max(converted, key=lambda split: abs(split.value))
+    largest.value -= sum(split.value for split in splits)
+
+
+def convert_to_yen(
+    db_contents: DbContents, prices: PriceIndex
+) -> TransactionSplit:
+    """Convert the transactions in other currencies into yen.
+
+    Return the converted splits.
+    """
+    converted = []
+    for splits in db_contents.transaction_splits.values():
+        transaction = splits[0].transaction
+        if transaction.currency == YEN:
+            continue
+        price_date, rate = find_rate(
+            prices, transaction.currency, transaction.date
+        )
+        convert_splits(splits, rate)
+        transaction.conversion = (
+            f"{transaction.currency} {rate} {price_date.isoformat()}"
+        )
+        converted += splits
+    return converted
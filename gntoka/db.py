@@ -10,25 +10,48 @@ from pathlib import (
     Path,
 )
 from typing import (
+    Callable,
+    Dict,
+    Iterable,
     Mapping,
+    Optional,
     Sequence,
     cast,
 )
 
 from . import (
+    currency,
     util,
 )
+from .constants import (
+    KAIKEIO_NO_ACCOUNT,
+    YEN,
+)
 from .serialize import (
+    AccountBalanceDict,
+    PriceDict,
     SplitDict,
     deserialize_account,
+    deserialize_account_balance,
+    deserialize_price,
     deserialize_transaction,
 )
 from .types import (
+    AccountBalance,
+    AccountIds,
+    AccountNames,
+    AccountPaths,
     AccountStore,
+    BalanceKey,
     Configuration,
     DbContents,
+    PriceIndex,
+    Slots,
+    Snapshot,
     Split,
+    TransactionSplit,
     TransactionStore,
+    TrialBalance,
 )
 
 
@@ -36,8 +59,22 @@ from .types import (
 # TODO decide if that is an issue
 SQL_PATH = Path("gntoka/sql")
 select_accounts = (SQL_PATH / "select_accounts.sql").read_text()
+select_account_paths = (SQL_PATH / "select_account_paths.sql").read_text()
+select_account_subtrees = (
+    SQL_PATH / "select_account_subtrees.sql"
+).read_text()
 select_transactions = (SQL_PATH / "select_transactions.sql").read_text()
+select_transactions_by_accounts = (
+    SQL_PATH / "select_transactions_by_accounts.sql"
+).read_text()
 select_splits = (SQL_PATH / "select_splits.sql").read_text()
+select_trial_balance = (SQL_PATH / "select_trial_balance.sql").read_text()
+select_prices = (SQL_PATH / "select_prices.sql").read_text()
+select_slots = (SQL_PATH / "select_slots.sql").read_text()
+
+MMAP_SIZE = 2**40
+# Copy this many pages at a time, so GnuCash can write between the steps
+BACKUP_PAGES = 1024
 
 
 def dict_factory(
@@ -48,31 +85,93 @@ def dict_factory(
     return {col[0]: row[idx] for idx, col in enumerate(cursor.description)}
 
 
+def fill_filter_table(
+    con: sqlite3.Connection,
+    table: str,
+    values: Iterable[str],
+) -> None:
+    """Replace the contents of a temporary table used to filter a query."""
+    con.execute(
+        f"create temp table if not exists {table} (value text primary key)"
+    )
+    con.execute(f"delete from temp.{table}")
+    con.executemany(
+        f"insert or ignore into temp.{table} values (?)",
+        ((value,) for value in values),
+    )
+
+
 def get_accounts(
     con: sqlite3.Connection,
 ) -> AccountStore:
     """Get all accounts and link them with Kaikeio information."""
     cur = con.cursor()
     cur.execute(select_accounts)
-    accounts = (deserialize_account(r) for r in cur.fetchall())
+    rows = cur.fetchall()
+    texts = util.clean_texts(row["supplementary_name"] for row in rows)
+    accounts = (deserialize_account(row, texts) for row in rows)
     return {account.guid: account for account in accounts}
 
 
+def get_account_paths(
+    con: sqlite3.Connection,
+) -> AccountPaths:
+    """Get the full name of every account, like "Expenses:Dining"."""
+    cur = con.cursor()
+    cur.execute(select_account_paths)
+    return {row["guid"]: row["path"] for row in cur.fetchall()}
+
+
+def get_account_subtrees(
+    con: sqlite3.Connection,
+    paths: AccountNames,
+) -> AccountIds:
+    """Get the guids of the accounts below and including the given paths.
+
+    Paths are full GnuCash account names, like "Expenses:Dining".
+    """
+    fill_filter_table(con, "account_paths_filter", paths)
+    con.execute(
+        "create temp view if not exists account_paths as "
+        f"{select_account_paths}"
+    )
+    cur = con.cursor()
+    cur.execute(select_account_subtrees)
+    rows = cur.fetchall()
+    missing = set(paths) - {row["subtree_path"] for row in rows}
+    if missing:
+        raise ValueError(
+            f"Expected to find GnuCash accounts for {sorted(missing)}"
+        )
+    return {row["guid"] for row in rows}
+
+
 def get_transactions(
     con: sqlite3.Connection,
     start_date: date,
     end_date: date,
+    account_ids: Optional[AccountIds] = None,
 ) -> TransactionStore:
-    """Get all transactions."""
+    """Get all transactions.
+
+    If account_ids is given, only get transactions that have a split in one
+    of these accounts.
+    """
     cur = con.cursor()
     query = {
         "start_date": start_date,
         "end_date": end_date,
     }
-    cur.execute(select_transactions, query)
+    if account_ids is None:
+        cur.execute(select_transactions, query)
+    else:
+        fill_filter_table(con, "account_guids_filter", account_ids)
+        cur.execute(select_transactions_by_accounts, query)
+    rows = cur.fetchall()
+    texts = util.clean_texts(row["description"] for row in rows)
     return {
         tx.guid: tx
-        for tx in (deserialize_transaction(row) for row in cur.fetchall())
+        for tx in (deserialize_transaction(row, texts) for row in rows)
     }
 
 
@@ -80,10 +179,15 @@ def get_splits(
     con: sqlite3.Connection,
     db_contents: DbContents,
 ) -> None:
-    """Get all splits."""
+    """Get all splits belonging to the transactions in db_contents."""
+    fill_filter_table(
+        con, "transaction_guids_filter", db_contents.transaction_store
+    )
     cur = con.cursor()
     cur.execute(select_splits)
-    for row in cur.fetchall():
+    rows = cur.fetchall()
+    texts = util.clean_texts(row["memo"] for row in rows)
+    for row in rows:
         split_dict = cast(SplitDict, row)
         account = db_contents.account_store.get(split_dict["account_guid"])
         if account is None:
@@ -92,21 +196,140 @@ def get_splits(
                 f"{split_dict['account_guid']} among the imported GnuCash "
                 "accounts"
             )
-        transaction = db_contents.transaction_store.get(split_dict["tx_guid"])
-        if transaction is None:
-            continue
+        transaction = db_contents.transaction_store[split_dict["tx_guid"]]
         split = Split(
             guid=split_dict["guid"],
             account=account,
             transaction=transaction,
-            memo=util.clean_text(split_dict["memo"]),
-            value=Decimal(split_dict["value_num"]),
+            memo=texts.get(split_dict["memo"]),
+            value=Decimal(split_dict["value_num"])
+            / Decimal(split_dict["value_denom"]),
+            quantity=Decimal(split_dict["quantity_num"])
+            / Decimal(split_dict["quantity_denom"]),
         )
         db_contents.split_store[split.guid] = split
 
 
+def get_prices(
+    con: sqlite3.Connection,
+) -> PriceIndex:
+    """Get the prices of all currencies in yen."""
+    cur = con.cursor()
+    cur.execute(select_prices, {"yen": YEN})
+    return currency.build_price_index(
+        deserialize_price(cast(PriceDict, row)) for row in cur.fetchall()
+    )
+
+
+def get_slots(
+    con: sqlite3.Connection,
+    names: Iterable[str],
+) -> Slots:
+    """Get the named slots of the accounts and of the exported transactions.
+
+    This also covers the splits of the transactions, so it needs to run after
+    get_splits. Only integer, string and guid slots are read.
+    """
+    fill_filter_table(con, "slot_names_filter", names)
+    cur = con.cursor()
+    cur.execute(select_slots)
+    slots: Slots = {}
+    for row in cur.fetchall():
+        if row["value"] is not None:
+            slots.setdefault(row["obj_guid"], {})[row["name"]] = row["value"]
+    return slots
+
+
+def fill_converted_values(
+    con: sqlite3.Connection,
+    splits: TransactionSplit,
+) -> None:
+    """Replace the yen values of the splits converted from other currencies."""
+    con.execute(
+        "create temp table if not exists converted_values "
+        "(guid text primary key, value integer)"
+    )
+    con.execute("delete from temp.converted_values")
+    con.executemany(
+        "insert into temp.converted_values values (?, ?)",
+        ((split.guid, int(split.value)) for split in splits),
+    )
+
+
+def get_trial_balance(
+    con: sqlite3.Connection,
+    converted: TransactionSplit,
+) -> TrialBalance:
+    """Total the splits of each Kaikeio account.
+
+    Only the splits of the transactions read by get_splits are included.
+    converted holds the splits that were converted into yen.
+    """
+    fill_converted_values(con, converted)
+    con.execute(
+        f"create temp view if not exists linked_accounts as {select_accounts}"
+    )
+    cur = con.cursor()
+    cur.execute(select_trial_balance, {"no_account": KAIKEIO_NO_ACCOUNT})
+    rows = cur.fetchall()
+    texts = util.clean_texts(row["supplementary_name"] for row in rows)
+    # An account has a row for each denominator of its splits
+    balances: Dict[BalanceKey, AccountBalance] = {}
+    for row in rows:
+        balance = deserialize_account_balance(
+            cast(AccountBalanceDict, row), texts
+        )
+        key = (balance.code, balance.supplementary_code)
+        if key in balances:
+            balances[key].debit += balance.debit
+            balances[key].credit += balance.credit
+        else:
+            balances[key] = balance
+    return list(balances.values())
+
+
+def connect(path: Path) -> sqlite3.Connection:
+    """Connect to the GnuCash book directly."""
+    return sqlite3.connect(path)
+
+
+def connect_immutable(path: Path) -> sqlite3.Connection:
+    """Connect to the GnuCash book without taking any locks.
+
+    SQLite trusts that nobody writes to the book while we read it, so
+    GnuCash should not save the book during an export.
+    """
+    con = sqlite3.connect(
+        f"{path.resolve().as_uri()}?mode=ro&immutable=1", uri=True
+    )
+    # SQLite caps this at its compile time maximum
+    con.execute(f"pragma mmap_size = {MMAP_SIZE}")
+    return con
+
+
+def connect_backup(path: Path) -> sqlite3.Connection:
+    """Copy the GnuCash book into memory and connect to the copy.
+
+    The copy is consistent even if GnuCash saves the book in the meantime.
+    """
+    source = sqlite3.connect(f"{path.resolve().as_uri()}?mode=ro", uri=True)
+    con = sqlite3.connect(":memory:")
+    try:
+        source.backup(con, pages=BACKUP_PAGES)
+    finally:
+        source.close()
+    return con
+
+
+connectors: Mapping[Snapshot, Callable[[Path], sqlite3.Connection]] = {
+    Snapshot.NONE: connect,
+    Snapshot.IMMUTABLE: connect_immutable,
+    Snapshot.BACKUP: connect_backup,
+}
+
+
 def open_connection(config: Configuration) -> sqlite3.Connection:
     """Open a connection to the db."""
-    con = sqlite3.connect(config.gnucash_db)
+    con = connectors[config.snapshot](config.gnucash_db)
     con.row_factory = dict_factory
     return con
@@ -0,0 +1,118 @@
+"""Kaikeio departments and sticky notes, resolved from GnuCash slots.
+
+Rules are compiled into a DepartmentIndex by account once. The slots they
+need are read in bulk beforehand, so resolving the department of a split
+is a few dictionary lookups.
+"""
+from typing import (
+    Any,
+    Mapping,
+    Optional,
+    Set,
+)
+
+from . import (
+    tax,
+)
+from .types import (
+    DbContents,
+    Department,
+    DepartmentIndex,
+    DepartmentRule,
+    DepartmentRules,
+    Slots,
+    Split,
+)
+
+
+NO_DEPARTMENT = Department()
+NO_SLOTS: Mapping[str, str] = {}
+
+
+def deserialize_department(department: Mapping[str, Any]) -> Department:
+    """Deserialize a department from the configuration."""
+    return Department(
+        code=str(department.get("code", NO_DEPARTMENT.code)),
+        name=str(department.get("name", NO_DEPARTMENT.name)),
+        tag1=str(department.get("tag1", NO_DEPARTMENT.tag1)),
+        tag2=str(department.get("tag2", NO_DEPARTMENT.tag2)),
+    )
+
+
+def deserialize_department_rule(rule: Mapping[str, Any]) -> DepartmentRule:
+    """Deserialize a rule from the department_rules table."""
+    return DepartmentRule(
+        slot=str(rule["slot"]),
+        departments={
+            str(value): deserialize_department(department)
+            for value, department in rule.get("departments", {}).items()
+        },
+        default=deserialize_department(rule.get("default", {})),
+        account_guids=tuple(rule.get("account_guids", ())),
+        account_codes=tuple(rule.get("account_codes", ())),
+        account_paths=tuple(rule.get("account_paths", ())),
+    )
+
+
+def slot_names(rules: DepartmentRules) -> Set[str]:
+    """Get the names of the slots the rules look at."""
+    return {rule.slot for rule in rules}
+
+
+def compile_department_index(
+    rules: DepartmentRules, db_contents: DbContents
+) -> DepartmentIndex:
+    """Find the first rule applying to each account."""
+    index: DepartmentIndex = {}
+    for account in db_contents.account_store.values():
+        path = db_contents.account_paths.get(account.guid, "")
+        rule = next(
+            (
+                rule
+                for rule in rules
+                if tax.matches_account(rule, account, path)
+            ),
+            None,
+        )
+        if rule:
+            index[account.guid] = rule
+    return index
+
+
+def find_slot_value(slots: Slots, name: str, split: Split) -> Optional[str]:
+    """Find a slot of the split, its transaction or its account."""
+    for guid in (split.guid, split.transaction.guid, split.account.guid):
+        value = slots.get(guid, NO_SLOTS).get(name)
+        if value is not None:
+            return value
+    return None
+
+
+def find_department(
+    index: DepartmentIndex, slots: Slots, split: Split
+) -> Optional[Department]:
+    """Find the department of a split, if any rule applies to it."""
+    rule = index.get(split.account.guid)
+    if rule is None:
+        return None
+    value = find_slot_value(slots, rule.slot, split)
+    if value is None:
+        return rule.default
+    department = rule.departments.get(value)
+    if department is None:
+        raise ValueError(
+            f"Expected a department for slot {rule.slot} value {value!r} "
+            f"of split {split.guid}"
+        )
+    return department
+
+
+def assign_departments(
+    rules: DepartmentRules, db_contents: DbContents
+) -> None:
+    """Resolve the department of every split in db_contents."""
+    if not rules:
+        return
+    index = compile_department_index(rules, db_contents)
+    for split in db_contents.split_store.values():
+        split.department = find_department(index, db_contents.slots, split)
@@ -1,4 +1,7 @@
 """Build journal entries."""
+from dataclasses import (
+    replace,
+)
 from datetime import (
     date,
 )
@@ -9,23 +12,54 @@ from itertools import (
     count,
 )
 from typing import (
+    Dict,
     Optional,
+    Tuple,
 )
 
 from . import (
+    tax,
     util,
 )
+from .constants import (
+    DEFAULT_CONSUMPTION_TAX_METHOD,
+)
+from .department import (
+    NO_DEPARTMENT,
+)
+from .serialize import (
+    KAIKEIO_MEMO_LENGTH,
+    KAIKEIO_SUMMARY_CUTOFF,
+)
 from .types import (
     Account,
+    ConsumptionTax,
     ConsumptionTaxRate,
+    Department,
     JournalEntries,
     JournalEntry,
     JournalEntryCounter,
     Split,
+    TaxIndex,
+    Transaction,
     TransactionSplit,
 )
 
 
+NO_DEBIT_TAX = ConsumptionTax(
+    tax_class="0",
+    consumption_tax_method=DEFAULT_CONSUMPTION_TAX_METHOD,
+    rate=ConsumptionTaxRate.ZERO,
+    amount=Decimal(0),
+)
+NO_CREDIT_TAX = ConsumptionTax(
+    tax_class="",
+    consumption_tax_method=DEFAULT_CONSUMPTION_TAX_METHOD,
+    rate=ConsumptionTaxRate.ZERO,
+    amount=Decimal(0),
+)
+
+
 # Maybe we can have an account / amount tuple here?
 def make_journal_entry(
     slip_number: int,
@@ -37,8 +71,20 @@ def make_journal_entry(
     credit_amount: Optional[Decimal],
     description: Optional[str],
     description_supplementary: Optional[str],
+    debit_tax: Optional[ConsumptionTax] = None,
+    credit_tax: Optional[ConsumptionTax] = None,
+    conversion: Optional[str] = None,
+    transaction_guid: str = "",
+    split_guids: Tuple[str, ...] = (),
+    debit_department: Optional[Department] = None,
+    credit_department: Optional[Department] = None,
 ) -> JournalEntry:
-    """Make a JournalEntry."""
+    """Make a JournalEntry.
+
+    conversion describes how the amounts were converted into yen.
+    The sticky notes are those of the debit department, if any.
+    transaction_guid and split_guids tell where the entry came from.
+    """
     if debit_account:
         debit_code = debit_account.code
         debit_name = debit_account.name
@@ -72,7 +118,12 @@ def make_journal_entry(
     else:
         credit_amount = Decimal(0)
 
-    memo = f"{date.today().isoformat()}"
+    memo = " ".join(filter(None, (date.today().isoformat(), conversion)))
+    debit_tax = debit_tax or NO_DEBIT_TAX
+    credit_tax = credit_tax or NO_CREDIT_TAX
+    tags = debit_department or credit_department or NO_DEPARTMENT
+    debit_department = debit_department or NO_DEPARTMENT
+    credit_department = credit_department or NO_DEPARTMENT
 
     return JournalEntry(
         slip_number=slip_number,
@@ -82,67 +133,93 @@ def make_journal_entry(
         debit_name=debit_name,
         debit_supplementary_code=debit_supplementary_code,
         debit_supplementary_name=debit_supplementary_name,
-        debit_department_code="0",
-        debit_department_name="",
-        debit_tax_class="0",
+        debit_department_code=debit_department.code,
+        debit_department_name=debit_department.name,
+        debit_tax_class=debit_tax.tax_class,
         debit_business_category="0",
-        debit_consumption_tax_method="3",
-        debit_consumption_tax_rate=ConsumptionTaxRate.ZERO,
+        debit_consumption_tax_method=debit_tax.consumption_tax_method,
+        debit_consumption_tax_rate=debit_tax.rate,
         debit_amount=debit_amount,
-        debit_consumption_tax_amount=Decimal("0"),
+        debit_consumption_tax_amount=debit_tax.amount,
         credit_code=credit_code,
         credit_name=credit_name,
         credit_supplementary_code=credit_supplementary_code,
         credit_supplementary_name=credit_supplementary_name,
-        credit_department_code="0",
-        credit_department_name="",
-        credit_tax_class="",
+        credit_department_code=credit_department.code,
+        credit_department_name=credit_department.name,
+        credit_tax_class=credit_tax.tax_class,
         credit_business_category="0",
-        credit_consumption_tax_method="3",
-        credit_consumption_tax_rate=ConsumptionTaxRate.ZERO,
+        credit_consumption_tax_method=credit_tax.consumption_tax_method,
+        credit_consumption_tax_rate=credit_tax.rate,
         credit_amount=credit_amount,
-        credit_consumption_tax_amount=Decimal("0"),
+        credit_consumption_tax_amount=credit_tax.amount,
         summary=description,
         supplementary_summary=description_supplementary,
         memo=memo,
-        # Set it to blue
-        tag1="3",
-        tag2="0",
+        tag1=tags.tag1,
+        tag2=tags.tag2,
         slip_type="0",
+        transaction_guid=transaction_guid,
+        split_guids=split_guids,
     )
 
 
+def source_guids(split: Split) -> Tuple[str, ...]:
+    """Get the guids of the GnuCash splits that a split stands for."""
+    return split.combined_guids or (split.guid,)
+
+
 def build_simple_journal_entry(
     slip_number: int,
     line_number: int,
     debit: Optional[Split],
     credit: Optional[Split],
+    taxes: TaxIndex,
+    fit: bool = False,
 ) -> JournalEntry:
-    """Build a simple journal entry."""
+    """Build a simple journal entry.
+
+    If fit is set, the memos of both sides are cut to fit into the Kaikeio
+    memo together, as aggregated splits do for one side.
+    """
     description_supplementary_parts = []
     debit_account = None
     debit_amount = None
+    debit_department = None
     credit_account = None
     credit_amount = None
+    credit_department = None
 
     if debit:
+        transaction = debit.transaction
         date = debit.transaction.date
         description = debit.transaction.description
+        conversion = debit.transaction.conversion
+        transaction_guid = debit.transaction.guid
         debit_account = debit.account
         debit_amount = debit.value
+        debit_department = debit.department
         if debit.memo:
             description_supplementary_parts.append(debit.memo)
 
     if credit:
+        transaction = credit.transaction
         date = credit.transaction.date
         description = credit.transaction.description
+        conversion = credit.transaction.conversion
+        transaction_guid = credit.transaction.guid
         credit_account = credit.account
         credit_amount = abs(credit.value)
+        credit_department = credit.department
         if credit.memo:
             description_supplementary_parts.append(credit.memo)
 
-    description_supplementary = util.clean_text(
-        " ".join(description_supplementary_parts)
+    # The memos and the description have already been cleaned
+    description_supplementary = " ".join(description_supplementary_parts)
+    description_supplementary = (
+        fit_memos(transaction, description_supplementary)
+        if fit
+        else description_supplementary
     )
 
     return make_journal_entry(
@@ -153,8 +230,20 @@ def build_simple_journal_entry(
         credit_account=credit_account,
         debit_amount=debit_amount,
         credit_amount=credit_amount,
-        description=util.clean_text(description),
-        description_supplementary=description_supplementary,
+        description=description,
+        description_supplementary=description_supplementary or None,
+        debit_tax=tax.find_consumption_tax(taxes, debit),
+        credit_tax=tax.find_consumption_tax(taxes, credit),
+        conversion=conversion,
+        transaction_guid=transaction_guid,
+        split_guids=tuple(
+            guid
+            for split in (debit, credit)
+            if split
+            for guid in source_guids(split)
+        ),
+        debit_department=debit_department,
+        credit_department=credit_department,
     )
 
 
@@ -162,6 +251,7 @@ def build_composite_journal_entry(
     slip_number: int,
     debits: TransactionSplit,
     credits: TransactionSplit,
+    taxes: TaxIndex,
 ) -> JournalEntries:
     """Build a composite journal entry using the 複合 intermediary."""
     line_number = count(1)
@@ -172,6 +262,7 @@ def build_composite_journal_entry(
             line_number=next(line_number),
             debit=debit,
             credit=None,
+            taxes=taxes,
         )
         result.append(entry)
     for credit in credits:
@@ -180,25 +271,113 @@ def build_composite_journal_entry(
             line_number=next(line_number),
             debit=None,
             credit=credit,
+            taxes=taxes,
         )
         result.append(entry)
     return result
 
 
+def memo_budget(transaction: Transaction) -> int:
+    """Get how many Shift_JIS bytes the memos of a row may take.
+
+    Long memos overflow into the Kaikeio memo, which also holds the export
+    date, the conversion into yen and a long description.
+    """
+    budget = KAIKEIO_MEMO_LENGTH - len(date.today().isoformat()) - 1
+    if transaction.conversion:
+        budget -= len(transaction.conversion) + 1
+    description = transaction.description
+    if description and len(description) > KAIKEIO_SUMMARY_CUTOFF:
+        budget -= util.length_sjis(description) + 1
+    return max(budget, 0)
+
+
+def fit_memos(transaction: Transaction, memos: str) -> str:
+    """Cut the memos of a row to fit into the Kaikeio memo.
+
+    An aggregated simple entry joins the memos of both sides, which may not
+    fit together even if each side does.
+    """
+    # Memos that don't overflow the summary never reach the Kaikeio memo
+    if len(memos) <= KAIKEIO_SUMMARY_CUTOFF:
+        return memos
+    return util.truncate_sjis(memos, memo_budget(transaction))
+
+
+def combine_splits(splits: TransactionSplit) -> Split:
+    """Combine splits to the same account into one.
+
+    The values are added up and the distinct memos joined. The combined split
+    remembers the guids of the splits it stands for.
+    """
+    first = splits[0]
+    if len(splits) == 1:
+        return first
+    memos = " ".join(
+        dict.fromkeys(split.memo for split in splits if split.memo)
+    )
+    return replace(
+        first,
+        memo=util.truncate_sjis(memos, memo_budget(first.transaction)) or None,
+        value=sum((split.value for split in splits), Decimal(0)),
+        combined_guids=tuple(
+            guid for split in splits for guid in source_guids(split)
+        ),
+    )
+
+
+def aggregate_splits(splits: TransactionSplit) -> TransactionSplit:
+    """Combine the splits of each account and department, in one pass.
+
+    Groups keep the order in which their first split appears.
+    """
+    groups: Dict[Tuple[str, Optional[Department]], TransactionSplit] = {}
+    for split in splits:
+        groups.setdefault((split.account.guid, split.department), []).append(
+            split
+        )
+    return [combine_splits(group) for group in groups.values()]
+
+
+def count_journal_entries(tx: TransactionSplit) -> int:
+    """Count the journal entries of a transaction, without aggregation."""
+    debits = sum(1 for _ in util.get_debits(tx))
+    credits = sum(1 for _ in util.get_credits(tx))
+    if debits == 1 and credits == 1:
+        return 1
+    return debits + credits
+
+
 def build_journal_entries(
-    counter: JournalEntryCounter, tx: TransactionSplit
+    counter: JournalEntryCounter,
+    tx: TransactionSplit,
+    taxes: TaxIndex,
+    aggregate: bool = False,
 ) -> JournalEntries:
-    """Build journal entries given a transaction."""
+    """Build journal entries given a transaction.
+
+    If aggregate is set, the debits and the credits of each account are
+    combined into one line.
+    """
     assert len(tx) > 1, tx
     assert sum(split.value for split in tx) == Decimal(0), tx
     debits = list(util.get_debits(tx))
     credits = list(util.get_credits(tx))
+    if aggregate:
+        debits = aggregate_splits(debits)
+        credits = aggregate_splits(credits)
     slip_number = next(counter)
     if len(debits) == 1 and len(credits) == 1:
         # Simple split
         (debit,) = debits
         (credit,) = credits
-        return [build_simple_journal_entry(slip_number, 1, debit, credit)]
+        return [
+            build_simple_journal_entry(
+                slip_number, 1, debit, credit, taxes, fit=aggregate
+            )
+        ]
         # Compound split
     else:
-        return build_composite_journal_entry(slip_number, debits, credits)
+        return build_composite_journal_entry(
+            slip_number, debits, credits, taxes
+        )
@@ -0,0 +1,143 @@
+"""Slip number ledger.
+
+The ledger is a small SQLite database remembering which slip number each
+GnuCash transaction was exported with, so that exporting a transaction again
+gives it the same slip number.
+"""
+import sqlite3
+from itertools import (
+    count,
+)
+from pathlib import (
+    Path,
+)
+from typing import (
+    List,
+    Sequence,
+    Tuple,
+)
+
+from .db import (
+    SQL_PATH,
+)
+
+
+create_slip_ledger = (SQL_PATH / "create_slip_ledger.sql").read_text()
+reserve_slip_numbers = (SQL_PATH / "reserve_slip_numbers.sql").read_text()
+select_slip_numbers = (SQL_PATH / "select_slip_numbers.sql").read_text()
+select_slip_gaps = (SQL_PATH / "select_slip_gaps.sql").read_text()
+
+# How long to wait for another export to finish its reservation, in seconds
+LEDGER_TIMEOUT = 60.0
+
+SlipNumberRange = Tuple[int, int]
+
+
+def open_ledger(path: Path) -> sqlite3.Connection:
+    """Open the ledger, creating it if necessary."""
+    # We manage transactions ourselves, see allocate_slip_numbers
+    con = sqlite3.connect(path, timeout=LEDGER_TIMEOUT, isolation_level=None)
+    con.executescript(create_slip_ledger)
+    return con
+
+
+def open_ledger_read_only(path: Path) -> sqlite3.Connection:
+    """Open the ledger without ever writing to it.
+
+    A ledger that does not exist yet is opened as an empty one in memory.
+    """
+    if not path.exists():
+        con = sqlite3.connect(":memory:")
+        con.executescript(create_slip_ledger)
+        return con
+    return sqlite3.connect(
+        f"{path.resolve().as_uri()}?mode=ro", uri=True, timeout=LEDGER_TIMEOUT
+    )
+
+
+def fill_requested_slips(
+    con: sqlite3.Connection, tx_guids: Sequence[str]
+) -> None:
+    """Store the transactions to number in a temporary table, in order."""
+    con.execute(
+        "create temp table if not exists requested_slips "
+        "(position integer primary key, tx_guid text not null)"
+    )
+    con.execute("delete from temp.requested_slips")
+    con.executemany(
+        "insert into temp.requested_slips values (?, ?)",
+        enumerate(tx_guids),
+    )
+
+
+def first_new_slip_number(con: sqlite3.Connection, start_num: int) -> int:
+    """Get the slip number after the highest one in the ledger."""
+    (last_slip_number,) = con.execute(
+        "select coalesce(max(slip_number), 0) from slips"
+    ).fetchone()
+    return max(int(last_slip_number) + 1, start_num)
+
+
+def allocate_slip_numbers(
+    con: sqlite3.Connection,
+    tx_guids: Sequence[str],
+    start_num: int,
+) -> List[int]:
+    """Get a slip number for each transaction, in the same order.
+
+    Transactions already in the ledger keep their slip number. All other
+    transactions get a block of new slip numbers after the highest number
+    in the ledger, but not below start_num. The block is reserved while
+    holding the ledger's write lock, so concurrent exports never hand out
+    the same number twice.
+    """
+    con.execute("begin immediate")
+    try:
+        fill_requested_slips(con, tx_guids)
+        first_slip_number = first_new_slip_number(con, start_num)
+        reserved = con.execute(
+            reserve_slip_numbers, {"first_slip_number": first_slip_number}
+        ).rowcount
+        if reserved:
+            con.execute(
+                "insert into reservations "
+                "(first_slip_number, last_slip_number) values (?, ?)",
+                (first_slip_number, first_slip_number + reserved - 1),
+            )
+        slip_numbers = [
+            slip_number for (slip_number,) in con.execute(select_slip_numbers)
+        ]
+        con.execute("commit")
+    except BaseException:
+        con.execute("rollback")
+        raise
+    return slip_numbers
+
+
+def preview_slip_numbers(
+    con: sqlite3.Connection,
+    tx_guids: Sequence[str],
+    start_num: int,
+) -> List[int]:
+    """Get the slip numbers allocate_slip_numbers would give, in order.
+
+    Nothing is reserved, so this works on a read only ledger.
+    """
+    fill_requested_slips(con, tx_guids)
+    new_slip_numbers = count(first_new_slip_number(con, start_num))
+    return [
+        next(new_slip_numbers) if slip_number is None else slip_number
+        for (slip_number,) in con.execute(
+            "select slips.slip_number from temp.requested_slips "
+            "left join slips on requested_slips.tx_guid = slips.tx_guid "
+            "order by requested_slips.position"
+        ).fetchall()
+    ]
+
+
+def find_gaps(con: sqlite3.Connection) -> List[SlipNumberRange]:
+    """Find ranges of slip numbers that were skipped in the ledger.
+
+    Both ends of each range are inclusive.
+    """
+    return [(first, last) for first, last in con.execute(select_slip_gaps)]
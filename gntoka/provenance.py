@@ -0,0 +1,100 @@
+"""Map journal rows back to the GnuCash splits they came from.
+
+The index is a binary file of fixed-width records, one per split and row,
+sorted by slip and line number. Numbers are stored big-endian, so the records
+sort the same as their bytes, and a row is found by binary search in the
+memory-mapped file.
+"""
+import mmap
+import struct
+from pathlib import (
+    Path,
+)
+from typing import (
+    Iterator,
+    List,
+    Tuple,
+)
+
+from .types import (
+    JournalEntries,
+)
+
+
+MAGIC = b"GNTKIDX1"
+# Slip number, line number, transaction guid, split guid
+RECORD = struct.Struct(">IH16s16s")
+KEY = struct.Struct(">IH")
+
+# Transaction guid and split guid
+SplitSource = Tuple[str, str]
+
+
+def pack_records(entries: JournalEntries) -> Iterator[bytes]:
+    """Pack a record for every split of every entry."""
+    for entry in entries:
+        transaction_guid = bytes.fromhex(entry.transaction_guid)
+        for split_guid in entry.split_guids:
+            yield RECORD.pack(
+                entry.slip_number,
+                entry.line_number,
+                transaction_guid,
+                bytes.fromhex(split_guid),
+            )
+
+
+def write_index(path: Path, entries: JournalEntries) -> None:
+    """Write the provenance index of a journal."""
+    records = sorted(pack_records(entries))
+    with path.open("wb") as fd:
+        fd.write(MAGIC)
+        fd.writelines(records)
+
+
+def read_record(index: mmap.mmap, position: int) -> bytes:
+    """Read the record at a position of the index."""
+    start = len(MAGIC) + position * RECORD.size
+    end = start + RECORD.size
+    return index[start:end]
+
+
+def find_first(index: mmap.mmap, key: bytes) -> int:
+    """Find the position of the first record starting with key, or later."""
+    low, high = 0, (len(index) - len(MAGIC)) // RECORD.size
+    while low < high:
+        middle = (low + high) // 2
+        if read_record(index, middle)[: KEY.size] < key:
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+
+def read_records(
+    index: mmap.mmap, slip_number: int, line_number: int
+) -> List[bytes]:
+    """Read the records of a row."""
+    key = KEY.pack(slip_number, line_number)
+    count = (len(index) - len(MAGIC)) // RECORD.size
+    records = []
+    position = find_first(index, key)
+    while position < count and read_record(index, position).startswith(key):
+        records.append(read_record(index, position))
+        position += 1
+    return records
+
+
+def lookup(
+    path: Path, slip_number: int, line_number: int
+) -> List[SplitSource]:
+    """Find the transaction and split guids a row came from."""
+    with path.open("rb") as fd, mmap.mmap(
+        fd.fileno(), 0, access=mmap.ACCESS_READ
+    ) as index:
+        if index[: len(MAGIC)] != MAGIC:
+            raise ValueError(f"Expected {path} to be a provenance index")
+        records = read_records(index, slip_number, line_number)
+    return [
+        (transaction_guid.hex(), split_guid.hex())
+        for _, _, transaction_guid, split_guid in map(RECORD.unpack, records)
+    ]
@@ -0,0 +1,313 @@
+"""Compare a journal with the journal rows exported from Kaikeio.
+
+Rows are matched by slip and line number first. Rows left over on both sides
+are then matched by date, accounts and amounts, which catches rows that
+Kaikeio numbered differently.
+
+Kaikeio rows dated outside the exported period are skipped while reading.
+Large Kaikeio files are partitioned into bucket files on disk by slip and
+line number, and the rows left over by date, accounts and amounts, so that
+only one bucket needs to be held in memory at a time.
+"""
+import csv
+import tempfile
+from collections import (
+    defaultdict,
+)
+from datetime import (
+    date,
+)
+from pathlib import (
+    Path,
+)
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Sequence,
+    Tuple,
+)
+
+from . import (
+    util,
+)
+from .csv import (
+    KaikeoDialect,
+)
+from .serialize import (
+    journal_entry_columns,
+)
+from .types import (
+    CsvRow,
+    Reconciliation,
+    RowChange,
+)
+
+
+# The memo contains the export date, so it differs every time
+ignored_columns = ("メモ",)
+compared_columns = tuple(
+    column for column in journal_entry_columns if column not in ignored_columns
+)
+key_columns = ("伝票番号", "行番号")
+content_columns = (
+    "伝票日付",
+    "借方科目コード",
+    "借方補助コード",
+    "借方金額",
+    "貸方科目コード",
+    "貸方補助コード",
+    "貸方金額",
+)
+# Roughly what a row read from a CSV file takes in memory, in bytes. This is
+# several times its size on disk.
+ROW_MEMORY = 2048
+# Aim for buckets taking this much memory, in bytes
+BUCKET_MEMORY = 64 * 1024 * 1024
+READ_SIZE = 1024 * 1024
+
+RowKey = Tuple[str, ...]
+KeyFunction = Callable[[CsvRow], RowKey]
+
+
+def row_key(row: CsvRow) -> RowKey:
+    """Identify a row by its slip and line number."""
+    return tuple(row[column] for column in key_columns)
+
+
+def content_key(row: CsvRow) -> RowKey:
+    """Identify a row by its date, accounts and amounts."""
+    return tuple(row[column] for column in content_columns)
+
+
+def read_kaikeio_csv(path: Path) -> Iterator[CsvRow]:
+    """Read the rows of a journal exported from Kaikeio one by one."""
+    with path.open(encoding="shift_jis", newline="") as fd:
+        reader = csv.DictReader(fd, dialect=KaikeoDialect)
+        if tuple(reader.fieldnames or ()) != journal_entry_columns:
+            raise ValueError(
+                f"Expected {path} to have the columns {journal_entry_columns}"
+            )
+        yield from reader
+
+
+def in_period(
+    rows: Iterable[CsvRow], start_date: date, end_date: date
+) -> Iterator[CsvRow]:
+    """Skip rows dated outside a period, both ends inclusive."""
+    start, end = util.format_date(start_date), util.format_date(end_date)
+    return (row for row in rows if start <= row["伝票日付"] <= end)
+
+
+def count_buckets(path: Path) -> int:
+    """Get how many buckets the rows of a file need.
+
+    The rows are counted as lines, without decoding the file.
+    """
+    with path.open("rb") as fd:
+        lines = sum(
+            chunk.count(b"\n")
+            for chunk in iter(lambda: fd.read(READ_SIZE), b"")
+        )
+    return max(1, -(-lines * ROW_MEMORY // BUCKET_MEMORY))
+
+
+def split_rows(
+    rows: Iterable[CsvRow], buckets: int, key: KeyFunction
+) -> List[List[CsvRow]]:
+    """Split rows into buckets in memory by the hash of their key."""
+    result: List[List[CsvRow]] = [[] for _ in range(buckets)]
+    for row in rows:
+        result[hash(key(row)) % buckets].append(row)
+    return result
+
+
+def partition(
+    rows: Iterable[CsvRow],
+    directory: Path,
+    buckets: int,
+    key: KeyFunction = row_key,
+) -> List[Path]:
+    """Write rows into bucket files by the hash of their key."""
+    directory.mkdir(exist_ok=True)
+    paths = [directory / f"bucket-{bucket}.csv" for bucket in range(buckets)]
+    fds = [path.open("w", encoding="utf-8", newline="") for path in paths]
+    try:
+        writers = [
+            csv.DictWriter(fd, journal_entry_columns, dialect=KaikeoDialect)
+            for fd in fds
+        ]
+        for row in rows:
+            writers[hash(key(row)) % buckets].writerow(row)
+    finally:
+        for fd in fds:
+            fd.close()
+    return paths
+
+
+def read_bucket(path: Path) -> Iterator[CsvRow]:
+    """Read the rows of a bucket file."""
+    with path.open(encoding="utf-8", newline="") as fd:
+        yield from csv.DictReader(
+            fd, journal_entry_columns, dialect=KaikeoDialect
+        )
+
+
+def compare_rows(expected: CsvRow, actual: CsvRow) -> List[str]:
+    """Get the headers of the columns in which two rows differ."""
+    return [
+        column
+        for column in compared_columns
+        if expected[column] != actual[column]
+    ]
+
+
+def index_rows(
+    rows: Iterable[CsvRow], reconciliation: Reconciliation
+) -> Dict[RowKey, CsvRow]:
+    """Index rows by row key.
+
+    Rows repeating a row key are added to reconciliation as extra.
+    """
+    index: Dict[RowKey, CsvRow] = {}
+    for row in rows:
+        key = row_key(row)
+        if key in index:
+            reconciliation.extra.append(row)
+        else:
+            index[key] = row
+    return index
+
+
+def reconcile_bucket(
+    expected: Sequence[CsvRow],
+    actual_rows: Iterable[CsvRow],
+    reconciliation: Reconciliation,
+) -> None:
+    """Match rows by row key.
+
+    Unmatched rows are added to reconciliation as missing and extra.
+    """
+    actual = index_rows(actual_rows, reconciliation)
+    for row in expected:
+        actual_row = actual.pop(row_key(row), None)
+        if actual_row is None:
+            reconciliation.missing.append(row)
+            continue
+        columns = compare_rows(row, actual_row)
+        if columns:
+            reconciliation.changed.append(RowChange(row, actual_row, columns))
+    reconciliation.extra.extend(actual.values())
+
+
+def match_contents(reconciliation: Reconciliation) -> None:
+    """Match missing and extra rows by content."""
+    extra: Dict[RowKey, List[CsvRow]] = defaultdict(list)
+    for row in reconciliation.extra:
+        extra[content_key(row)].append(row)
+    missing = []
+    for row in reconciliation.missing:
+        candidates = extra.get(content_key(row))
+        if not candidates:
+            missing.append(row)
+            continue
+        actual_row = candidates.pop()
+        reconciliation.changed.append(
+            RowChange(row, actual_row, compare_rows(row, actual_row))
+        )
+    reconciliation.missing = missing
+    reconciliation.extra = [row for rows in extra.values() for row in rows]
+
+
+def reconcile_buckets(
+    expected: Sequence[Sequence[CsvRow]],
+    paths: Sequence[Path],
+    reconciliation: Reconciliation,
+) -> Iterator[CsvRow]:
+    """Match rows by row key, one bucket at a time.
+
+    Unmatched rows are added to reconciliation as missing, or yielded if they
+    are extra.
+    """
+    for rows, path in zip(expected, paths):
+        bucket = Reconciliation()
+        reconcile_bucket(rows, read_bucket(path), bucket)
+        reconciliation.missing += bucket.missing
+        reconciliation.changed += bucket.changed
+        yield from bucket.extra
+
+
+def reconcile_partitioned(
+    journal: Iterable[CsvRow],
+    actual_rows: Iterable[CsvRow],
+    buckets: int,
+    directory: Path,
+) -> Reconciliation:
+    """Match rows by row key and then by content, one bucket at a time."""
+    reconciliation = Reconciliation()
+    extra_paths = partition(
+        reconcile_buckets(
+            split_rows(journal, buckets, row_key),
+            partition(actual_rows, directory / "rows", buckets),
+            reconciliation,
+        ),
+        directory / "contents",
+        buckets,
+        content_key,
+    )
+    missing = split_rows(reconciliation.missing, buckets, content_key)
+    reconciliation.missing = []
+    for rows, path in zip(missing, extra_paths):
+        bucket = Reconciliation(missing=rows, extra=list(read_bucket(path)))
+        match_contents(bucket)
+        reconciliation.missing += bucket.missing
+        reconciliation.extra += bucket.extra
+        reconciliation.changed += bucket.changed
+    return reconciliation
+
+
+def reconcile(
+    journal: Iterable[CsvRow],
+    kaikeio_csv: Path,
+    start_date: date,
+    end_date: date,
+) -> Reconciliation:
+    """Compare serialized journal entries with a Kaikeio journal CSV.
+
+    Only the Kaikeio rows dated from start_date to end_date are compared.
+    """
+    buckets = count_buckets(kaikeio_csv)
+    actual_rows = in_period(
+        read_kaikeio_csv(kaikeio_csv), start_date, end_date
+    )
+    if buckets > 1:
+        with tempfile.TemporaryDirectory() as tmp:
+            return reconcile_partitioned(
+                journal, actual_rows, buckets, Path(tmp)
+            )
+    reconciliation = Reconciliation()
+    reconcile_bucket(list(journal), actual_rows, reconciliation)
+    match_contents(reconciliation)
+    return reconciliation
+
+
+def format_row(row: CsvRow) -> str:
+    """Describe a row in one line."""
+    return " ".join(row[column] for column in key_columns + content_columns)
+
+
+def format_reconciliation(reconciliation: Reconciliation) -> Iterator[str]:
+    """Describe all differences, one per line."""
+    for row in reconciliation.missing:
+        yield f"missing {format_row(row)}"
+    for row in reconciliation.extra:
+        yield f"extra {format_row(row)}"
+    for change in reconciliation.changed:
+        differences = ", ".join(
+            f"{column} {change.actual[column]!r} -> "
+            f"{change.expected[column]!r}"
+            for column in change.columns
+        )
+        yield f"changed {format_row(change.actual)}: {differences}"
@@ -2,9 +2,20 @@
 from datetime import (
     date,
 )
+from decimal import (
+    Decimal,
+)
+from operator import (
+    attrgetter,
+)
 from typing import (
+    Callable,
+    Dict,
+    Mapping,
     Optional,
+    Sequence,
     TypedDict,
+    cast,
 )
 
 from . import (
@@ -13,9 +24,15 @@ from . import (
 )
 from .constants import (
     KAIKEIO_NO_ACCOUNT,
+    YEN,
+)
+from .types import (
+    Column,
+    ColumnType,
 )
 from .util import (
-    length_sjis,
+    SjisLengths,
+    fits_sjis,
 )
 
 
@@ -59,44 +76,100 @@ JournalEntryDict = TypedDict(
     },
 )
 
-# XXX I wish we could use __required_keys__ here, but it is not guaranteed to
-# be ordered
-journal_entry_columns = (
-    "伝票番号",
-    "行番号",
-    "伝票日付",
-    "借方科目コード",
-    "借方科目名称",
-    "借方補助コード",
-    "借方補助科目名称",
-    "借方部門コード",
-    "借方部門名称",
-    "借方課税区分",
-    "借方事業分類",
-    "借方消費税処理方法",
-    "借方消費税率",
-    "借方金額",
-    "借方消費税額",
-    "貸方科目コード",
-    "貸方科目名称",
-    "貸方補助コード",
-    "貸方補助科目名称",
-    "貸方部門コード",
-    "貸方部門名称",
-    "貸方課税区分",
-    "貸方事業分類",
-    "貸方消費税処理方法",
-    "貸方消費税率",
-    "貸方金額",
-    "貸方消費税額",
-    "摘要",
-    "補助摘要",
-    "メモ",
-    "付箋１",
-    "付箋２",
-    "伝票種別",
+ColumnSerializer = Callable[[types.JournalEntry, SjisLengths], str]
+JournalEntrySerializer = Callable[
+    [types.JournalEntry, SjisLengths], JournalEntryDict
+]
+
+KAIKEIO_AMOUNT_BOUNDS = (-9_999_999_999, 9_999_999_999)
+KAIKEIO_NAME_LENGTH = 30
+KAIKEIO_MEMO_LENGTH = 200
+# Everything we can't fit into the summaries we just cram into the memo
+KAIKEIO_SUMMARY_CUTOFF = 15
+
+
+def code_column(header: str, attribute: str) -> Column:
+    """Describe a column containing a Kaikeio code."""
+    # TODO Validate number here
+    return Column(
+        header, attribute, ColumnType.TEXT, default=KAIKEIO_NO_ACCOUNT
+    )
+
+
+def name_column(header: str, attribute: str) -> Column:
+    """Describe a column containing a name."""
+    return Column(
+        header, attribute, ColumnType.TEXT, max_length=KAIKEIO_NAME_LENGTH
+    )
+
+
+def amount_column(header: str, attribute: str) -> Column:
+    """Describe a column containing an amount in Yen."""
+    return Column(
+        header,
+        attribute,
+        ColumnType.AMOUNT,
+        bounds=KAIKEIO_AMOUNT_BOUNDS,
+        default="0",
+    )
+
+
+def summary_column(header: str, attribute: str) -> Column:
+    """Describe a summary column that overflows into the memo."""
+    return Column(
+        header,
+        attribute,
+        ColumnType.TEXT,
+        max_length=KAIKEIO_NAME_LENGTH,
+        overflow=KAIKEIO_SUMMARY_CUTOFF,
+    )
+
+
+# The order of this schema is the order of the columns in the CSV file.
+journal_entry_schema = (
+    Column("伝票番号", "slip_number", ColumnType.NUMBER, bounds=(0, 9_999_999)),
+    Column("行番号", "line_number", ColumnType.NUMBER, bounds=(1, 999)),
+    Column("伝票日付", "slip_date", ColumnType.DATE),
+    code_column("借方科目コード", "debit_code"),
+    name_column("借方科目名称", "debit_name"),
+    code_column("借方補助コード", "debit_supplementary_code"),
+    name_column("借方補助科目名称", "debit_supplementary_name"),
+    code_column("借方部門コード", "debit_department_code"),
+    name_column("借方部門名称", "debit_department_name"),
+    # TODO Validate further here
+    Column("借方課税区分", "debit_tax_class", ColumnType.TEXT),
+    # TODO Validate number here
+    Column("借方事業分類", "debit_business_category", ColumnType.TEXT),
+    # TODO Validate here
+    Column("借方消費税処理方法", "debit_consumption_tax_method", ColumnType.TEXT),
+    Column("借方消費税率", "debit_consumption_tax_rate", ColumnType.TAX_RATE),
+    amount_column("借方金額", "debit_amount"),
+    amount_column("借方消費税額", "debit_consumption_tax_amount"),
+    code_column("貸方科目コード", "credit_code"),
+    name_column("貸方科目名称", "credit_name"),
+    code_column("貸方補助コード", "credit_supplementary_code"),
+    name_column("貸方補助科目名称", "credit_supplementary_name"),
+    code_column("貸方部門コード", "credit_department_code"),
+    name_column("貸方部門名称", "credit_department_name"),
+    # TODO Validate further here
+    Column("貸方課税区分", "credit_tax_class", ColumnType.TEXT),
+    # TODO Validate number here
+    Column("貸方事業分類", "credit_business_category", ColumnType.TEXT),
+    # TODO Validate here
+    Column("貸方消費税処理方法", "credit_consumption_tax_method", ColumnType.TEXT),
+    Column("貸方消費税率", "credit_consumption_tax_rate", ColumnType.TAX_RATE),
+    amount_column("貸方金額", "credit_amount"),
+    amount_column("貸方消費税額", "credit_consumption_tax_amount"),
+    summary_column("摘要", "summary"),
+    summary_column("補助摘要", "supplementary_summary"),
+    Column("メモ", "memo", ColumnType.MEMO, max_length=KAIKEIO_MEMO_LENGTH),
+    Column("付箋１", "tag1", ColumnType.TEXT),
+    Column("付箋２", "tag2", ColumnType.TEXT),
+    Column("伝票種別", "slip_type", ColumnType.TEXT),
 )
 
+journal_entry_columns = tuple(column.header for column in journal_entry_schema)
+
 
 class AccountDict(TypedDict):
     """Encode GnuCash account information."""
@@ -106,6 +179,20 @@ class AccountDict(TypedDict):
     name: str
     supplementary_code: Optional[str]
     supplementary_name: Optional[str]
+    commodity: Optional[str]
+
+
+class AccountBalanceDict(TypedDict):
+    """Encode the totals of a Kaikeio account."""
+
+    code: str
+    name: Optional[str]
+    supplementary_code: str
+    supplementary_name: Optional[str]
+    # The totals are numerators over this denominator
+    value_denom: int
+    debit: int
+    credit: int
 
 
 class TransactionDict(TypedDict):
@@ -114,6 +201,7 @@ class TransactionDict(TypedDict):
     guid: str
     post_date: str
     description: str
+    currency: str
 
 
 class SplitDict(TypedDict):
@@ -124,210 +212,245 @@ class SplitDict(TypedDict):
     account_guid: str
     memo: str
     value_num: str
+    value_denom: str
+    quantity_num: str
+    quantity_denom: str
 
 
-# Serializers
-def serialize_consumption_tax_rate(value: types.ConsumptionTaxRate) -> str:
-    """Serialize consumption tax rate."""
-    if value == types.ConsumptionTaxRate.ZERO:
-        return "0%"
-    elif value == types.ConsumptionTaxRate.EIGHT_REDUCED:
-        return "8%軽"
-    elif value == types.ConsumptionTaxRate.TEN:
-        return "10%"
-    assert False, f"{value} is unexpected"
-
-
-def serialize_journal_entry(value: types.JournalEntry) -> JournalEntryDict:
-    """Serialize a journal entry."""
-    # Indexing
-    assert 0 <= value.slip_number <= 9_999_999, value.slip_number
-    slip_number = str(value.slip_number)
-
-    assert 0 < value.line_number <= 999, value.line_number
-    line_number = str(value.line_number)
-
-    slip_date = util.format_date(value.slip_date)
-
-    # Debit
-    # TODO Validate number here
-    debit_code = value.debit_code or KAIKEIO_NO_ACCOUNT
-
-    debit_name = value.debit_name or ""
-    assert length_sjis(debit_name) <= 30, debit_name
-
-    # TODO Validate number here
-    debit_supplementary_code = (
-        value.debit_supplementary_code or KAIKEIO_NO_ACCOUNT
-    )
-
-    debit_supplementary_name = value.debit_supplementary_name or ""
-    assert (
-        length_sjis(debit_supplementary_name) <= 30
-    ), debit_supplementary_name
-
-    # TODO Validate number here
-    debit_department_code = value.debit_department_code or KAIKEIO_NO_ACCOUNT
-
-    debit_department_name = value.debit_department_name or ""
-    assert length_sjis(debit_department_name) <= 30, debit_department_name
-
-    # TODO Validate further here
-    debit_tax_class = value.debit_tax_class
-
-    # TODO Validate number here
-    debit_business_category = value.debit_business_category
-
-    # TODO Validate here
-    debit_consumption_tax_method = value.debit_consumption_tax_method
-
-    # This one is valid by serialization
-    debit_consumption_tax_rate = serialize_consumption_tax_rate(
-        value.debit_consumption_tax_rate
-    )
-
-    if value.debit_amount:
-        assert (
-            -9_999_999_999 <= value.debit_amount <= 9_999_999_999
-        ), value.debit_amount
-    debit_amount = str(value.debit_amount or 0)
-
-    assert (
-        -9_999_999_999 <= value.debit_consumption_tax_amount <= 9_999_999_999
-    ), value.debit_consumption_tax_amount
-    debit_consumption_tax_amount = str(value.debit_consumption_tax_amount)
-
-    # Credit
-    # TODO Validate number here
-    credit_code = value.credit_code or KAIKEIO_NO_ACCOUNT
-
-    credit_name = value.credit_name or ""
-    assert length_sjis(credit_name) <= 30, credit_name
-
-    # TODO Validate number here
-    credit_supplementary_code = (
-        value.credit_supplementary_code or KAIKEIO_NO_ACCOUNT
-    )
-
-    credit_supplementary_name = value.credit_supplementary_name or ""
-    assert (
-        length_sjis(credit_supplementary_name) <= 30
-    ), credit_supplementary_name
-
-    # TODO Validate number here
-    credit_department_code = value.credit_department_code or KAIKEIO_NO_ACCOUNT
+class PriceDict(TypedDict):
+    """Encode a GnuCash price."""
 
-    credit_department_name = value.credit_department_name
-    assert length_sjis(credit_department_name) <= 30, credit_department_name
+    commodity: str
+    currency: str
+    date: str
+    value_num: int
+    value_denom: int
 
-    # TODO Validate further here
-    credit_tax_class = value.credit_tax_class
-
-    # TODO Validate number here
-    credit_business_category = value.credit_business_category
-
-    # TODO Validate here
-    credit_consumption_tax_method = value.credit_consumption_tax_method
 
-    # This one is valid by serialization
-    credit_consumption_tax_rate = serialize_consumption_tax_rate(
-        value.credit_consumption_tax_rate
-    )
+# Serializers
+consumption_tax_rates: Mapping[types.ConsumptionTaxRate, str] = {
+    types.ConsumptionTaxRate.ZERO: "0%",
+    types.ConsumptionTaxRate.EIGHT_REDUCED: "8%軽",
+    types.ConsumptionTaxRate.TEN: "10%",
+}
+
 
-    if value.credit_amount:
-        assert (
-            -9_999_999_999 <= value.credit_amount <= 9_999_999_999
-        ), value.credit_amount
-    credit_amount = str(value.credit_amount or 0)
-
-    credit_consumption_tax_amount = str(value.credit_consumption_tax_amount)
-    assert (
-        -9_999_999_999 <= value.credit_consumption_tax_amount <= 9_999_999_999
-    ), value.credit_consumption_tax_amount
-
-    # Annotations
-    append_to_memo: list[str] = []
-
-    summary = value.summary or ""
-    # Everything we couldn't add here we just cram into the memo
-    CUTOFF = 15
-    if len(summary) > CUTOFF:
-        append_to_memo.append(summary)
-        summary = summary[:CUTOFF]
-    assert length_sjis(summary) <= 30, summary
-
-    supplementary_summary = value.supplementary_summary or ""
-    # Everything we couldn't add here we just cram into the memo
-    if len(supplementary_summary) > CUTOFF:
-        append_to_memo.append(supplementary_summary)
-        supplementary_summary = supplementary_summary[:CUTOFF]
-    assert length_sjis(supplementary_summary) <= 30, supplementary_summary
-
-    original_memo = value.memo or ""
-    # And here we join it into the memo
-    memo = " ".join(append_to_memo + [original_memo])
-    assert length_sjis(memo) <= 200, memo
-
-    tag1 = value.tag1
-
-    tag2 = value.tag2
-
-    slip_type = value.slip_type
-
-    return {
-        "伝票番号": slip_number,
-        "行番号": line_number,
-        "伝票日付": slip_date,
-        "借方科目コード": debit_code,
-        "借方科目名称": debit_name,
-        "借方補助コード": debit_supplementary_code,
-        "借方補助科目名称": debit_supplementary_name,
-        "借方部門コード": debit_department_code,
-        "借方部門名称": debit_department_name,
-        "借方課税区分": debit_tax_class,
-        "借方事業分類": debit_business_category,
-        "借方消費税処理方法": debit_consumption_tax_method,
-        "借方消費税率": debit_consumption_tax_rate,
-        "借方金額": debit_amount,
-        "借方消費税額": debit_consumption_tax_amount,
-        "貸方科目コード": credit_code,
-        "貸方科目名称": credit_name,
-        "貸方補助コード": credit_supplementary_code,
-        "貸方補助科目名称": credit_supplementary_name,
-        "貸方部門コード": credit_department_code,
-        "貸方部門名称": credit_department_name,
-        "貸方課税区分": credit_tax_class,
-        "貸方事業分類": credit_business_category,
-        "貸方消費税処理方法": credit_consumption_tax_method,
-        "貸方消費税率": credit_consumption_tax_rate,
-        "貸方金額": credit_amount,
-        "貸方消費税額": credit_consumption_tax_amount,
-        "摘要": summary,
-        "補助摘要": supplementary_summary,
-        "メモ": memo,
-        "付箋１": tag1,
-        "付箋２": tag2,
-        "伝票種別": slip_type,
-    }
+def compile_number(
+    column: Column, schema: Sequence[Column]
+) -> ColumnSerializer:
+    """Compile a serializer for a bounded integer column."""
+    get = attrgetter(column.attribute)
+    assert column.bounds, column
+    lower, upper = column.bounds
+
+    def serialize(value: types.JournalEntry, lengths: SjisLengths) -> str:
+        number: int = get(value)
+        assert lower <= number <= upper, number
+        return str(number)
+
+    return serialize
+
+
+def compile_date(column: Column, schema: Sequence[Column]) -> ColumnSerializer:
+    """Compile a serializer for a date column."""
+    get = attrgetter(column.attribute)
+    # Slips share their dates, so we only format each date once
+    formatted: Dict[date, str] = {}
+
+    def serialize(value: types.JournalEntry, lengths: SjisLengths) -> str:
+        slip_date: date = get(value)
+        txt = formatted.get(slip_date)
+        if txt is None:
+            txt = formatted[slip_date] = util.format_date(slip_date)
+        return txt
+
+    return serialize
+
+
+def compile_text(column: Column, schema: Sequence[Column]) -> ColumnSerializer:
+    """Compile a serializer for a text column."""
+    get = attrgetter(column.attribute)
+    default = column.default
+    cutoff = column.overflow
+    max_length = column.max_length
+    if max_length is None:
+        return lambda value, lengths: get(value) or default
+    if cutoff is not None:
+        return compile_summary(get, default, cutoff, max_length)
+
+    def serialize(value: types.JournalEntry, lengths: SjisLengths) -> str:
+        txt: str = get(value) or default
+        assert fits_sjis(txt, max_length, lengths), txt
+        return txt
+
+    return serialize
+
+
+def compile_summary(
+    get: Callable[[types.JournalEntry], Optional[str]],
+    default: str,
+    cutoff: int,
+    max_length: int,
+) -> ColumnSerializer:
+    """Compile a serializer for a summary cut off at cutoff characters.
+
+    Summaries are nearly unique per row, so they are kept out of lengths.
+    """
+
+    def serialize(value: types.JournalEntry, lengths: SjisLengths) -> str:
+        txt = (get(value) or default)[:cutoff]
+        assert fits_sjis(txt, max_length), txt
+        return txt
+
+    return serialize
+
+
+def compile_amount(
+    column: Column, schema: Sequence[Column]
+) -> ColumnSerializer:
+    """Compile a serializer for an amount column."""
+    get = attrgetter(column.attribute)
+    default = column.default
+    assert column.bounds, column
+    lower, upper = column.bounds
+
+    def serialize(value: types.JournalEntry, lengths: SjisLengths) -> str:
+        amount: Optional[Decimal] = get(value)
+        if not amount:
+            return default
+        assert lower <= amount <= upper, amount
+        return str(amount)
+
+    return serialize
+
+
+def compile_tax_rate(
+    column: Column, schema: Sequence[Column]
+) -> ColumnSerializer:
+    """Compile a serializer for a consumption tax rate column."""
+    get = attrgetter(column.attribute)
+    return lambda value, lengths: consumption_tax_rates[get(value)]
+
+
+def compile_memo(column: Column, schema: Sequence[Column]) -> ColumnSerializer:
+    """Compile a serializer for the memo.
+
+    The memo collects the full text of every column that overflowed.
+    """
+    get = attrgetter(column.attribute)
+    overflowing = [
+        (attrgetter(other.attribute), other.overflow)
+        for other in schema
+        if other.overflow is not None
+    ]
+    assert column.max_length, column
+    max_length = column.max_length
+
+    def serialize(value: types.JournalEntry, lengths: SjisLengths) -> str:
+        parts = [
+            txt
+            for get_txt, cutoff in overflowing
+            if len(txt := get_txt(value) or "") > cutoff
+        ]
+        parts.append(get(value) or "")
+        memo = " ".join(parts)
+        # Memos are nearly unique per row, so keep them out of lengths
+        assert fits_sjis(memo, max_length), memo
+        return memo
+
+    return serialize
+
+
+column_compilers: Mapping[
+    ColumnType, Callable[[Column, Sequence[Column]], ColumnSerializer]
+] = {
+    ColumnType.NUMBER: compile_number,
+    ColumnType.DATE: compile_date,
+    ColumnType.TEXT: compile_text,
+    ColumnType.AMOUNT: compile_amount,
+    ColumnType.TAX_RATE: compile_tax_rate,
+    ColumnType.MEMO: compile_memo,
+}
+
+
+def compile_serializer(schema: Sequence[Column]) -> JournalEntrySerializer:
+    """Compile a journal entry serializer from a column schema."""
+    headers = [column.header for column in schema]
+    serializers = [
+        column_compilers[column.type](column, schema) for column in schema
+    ]
+
+    def serialize(
+        value: types.JournalEntry, lengths: SjisLengths
+    ) -> JournalEntryDict:
+        row = [
+            serialize_column(value, lengths)
+            for serialize_column in serializers
+        ]
+        return cast(JournalEntryDict, dict(zip(headers, row)))
+
+    return serialize
+
+
+serialize_journal_entry = compile_serializer(journal_entry_schema)
 
 
 # Deserializers
-def deserialize_account(account: AccountDict) -> types.Account:
-    """Deserialize an account fetched from GnuCash."""
+def deserialize_account(
+    account: AccountDict, texts: types.CleanTexts
+) -> types.Account:
+    """Deserialize an account fetched from GnuCash.
+
+    texts holds the cleaned up names, see util.clean_texts.
+    """
     return types.Account(
         guid=account["guid"],
         code=account["code"],
         name=account["name"],
         supplementary_code=account["supplementary_code"],
-        supplementary_name=util.clean_text(account["supplementary_name"]),
+        supplementary_name=texts.get(account["supplementary_name"]),
+        commodity=account["commodity"] or YEN,
+    )
+
+
+def deserialize_account_balance(
+    balance: AccountBalanceDict, texts: types.CleanTexts
+) -> types.AccountBalance:
+    """Deserialize the totals of an account.
+
+    texts holds the cleaned up names, see util.clean_texts.
+    """
+    return types.AccountBalance(
+        code=balance["code"],
+        name=balance["name"],
+        supplementary_code=balance["supplementary_code"],
+        supplementary_name=texts.get(balance["supplementary_name"]),
+        debit=Decimal(balance["debit"]) / Decimal(balance["value_denom"]),
+        credit=Decimal(balance["credit"]) / Decimal(balance["value_denom"]),
     )
 
 
-def deserialize_transaction(transaction: types.CsvRow) -> types.Transaction:
-    """Deserialize a transaction."""
+def deserialize_transaction(
+    transaction: types.CsvRow, texts: types.CleanTexts
+) -> types.Transaction:
+    """Deserialize a transaction.
+
+    texts holds the cleaned up descriptions, see util.clean_texts.
+    """
     return types.Transaction(
         guid=transaction["guid"],
         # TODO Use string format based parsing instead
         date=date.fromisoformat(transaction["post_date"].split(" ")[0]),
-        description=util.clean_text(transaction["description"]),
+        description=texts.get(transaction["description"]),
+        currency=transaction["currency"],
+    )
+
+
+def deserialize_price(price: PriceDict) -> types.Price:
+    """Deserialize a price fetched from GnuCash."""
+    return types.Price(
+        commodity=price["commodity"],
+        currency=price["currency"],
+        date=date.fromisoformat(price["date"].split(" ")[0]),
+        value=Decimal(price["value_num"]) / Decimal(price["value_denom"]),
     )
@@ -0,0 +1,12 @@
+create table if not exists slips (
+    tx_guid text primary key not null
+    , slip_number integer not null
+);
+create unique index if not exists slips_slip_number_index
+on slips(slip_number);
+create table if not exists reservations (
+    id integer primary key autoincrement not null
+    , first_slip_number integer not null
+    , last_slip_number integer not null
+    , reserved_at text not null default current_timestamp
+);
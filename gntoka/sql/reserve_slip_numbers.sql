@@ -0,0 +1,7 @@
+insert into slips (tx_guid, slip_number)
+select requested_slips.tx_guid
+, :first_slip_number - 1
+    + row_number() over (order by requested_slips.position)
+from temp.requested_slips
+where requested_slips.tx_guid not in (select tx_guid from slips)
+order by requested_slips.position
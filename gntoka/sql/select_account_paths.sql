@@ -0,0 +1,14 @@
+with recursive account_paths(guid, path) as (
+    select accounts.guid
+    , accounts.name
+    from accounts
+    inner join books on accounts.parent_guid = books.root_account_guid
+    union all
+    select accounts.guid
+    , account_paths.path || ':' || accounts.name
+    from accounts
+    inner join account_paths on accounts.parent_guid = account_paths.guid
+)
+select guid
+, path
+from account_paths
@@ -0,0 +1,15 @@
+with recursive account_subtrees(guid, subtree_path) as (
+    select account_paths.guid
+    , account_paths.path
+    from temp.account_paths
+    inner join temp.account_paths_filter
+    on account_paths.path = account_paths_filter.value
+    union
+    select accounts.guid
+    , account_subtrees.subtree_path
+    from accounts
+    inner join account_subtrees on accounts.parent_guid = account_subtrees.guid
+)
+select guid
+, subtree_path
+from account_subtrees
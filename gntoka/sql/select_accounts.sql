@@ -15,7 +15,9 @@ select accounts.guid
     when 1 then null
     else accounts.name
     end as supplementary_name
+, commodities.mnemonic as commodity
 from accounts
+left join commodities on accounts.commodity_guid = commodities.guid
 inner join (
     select guid
     , code
@@ -0,0 +1,9 @@
+select commodities.mnemonic as commodity
+, currencies.mnemonic as currency
+, prices.date
+, prices.value_num
+, prices.value_denom
+from prices
+inner join commodities on prices.commodity_guid = commodities.guid
+inner join commodities as currencies on prices.currency_guid = currencies.guid
+where :yen in (commodities.mnemonic, currencies.mnemonic)
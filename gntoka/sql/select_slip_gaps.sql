@@ -0,0 +1,8 @@
+select previous_slip_number + 1 as first_slip_number
+, slip_number - 1 as last_slip_number
+from (
+    select slip_number
+    , lag(slip_number) over (order by slip_number) as previous_slip_number
+    from slips
+)
+where slip_number - previous_slip_number > 1
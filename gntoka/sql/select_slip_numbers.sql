@@ -0,0 +1,4 @@
+select slips.slip_number
+from temp.requested_slips
+inner join slips on requested_slips.tx_guid = slips.tx_guid
+order by requested_slips.position
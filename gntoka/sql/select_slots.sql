@@ -0,0 +1,26 @@
+with named_slots as (
+    select slots.obj_guid
+    , slots.name
+    , case slots.slot_type
+        when 1 then cast(slots.int64_val as text)
+        when 4 then slots.string_val
+        when 5 then slots.guid_val
+    end as value
+    from slots
+    inner join temp.slot_names_filter
+    on slots.name = slot_names_filter.value
+)
+select named_slots.*
+from named_slots
+inner join temp.transaction_guids_filter
+on named_slots.obj_guid = transaction_guids_filter.value
+union all
+select named_slots.*
+from named_slots
+inner join splits on named_slots.obj_guid = splits.guid
+inner join temp.transaction_guids_filter
+on splits.tx_guid = transaction_guids_filter.value
+union all
+select named_slots.*
+from named_slots
+inner join accounts on named_slots.obj_guid = accounts.guid
@@ -1 +1,3 @@
-SELECT * FROM splits
+SELECT splits.* FROM splits
+inner join temp.transaction_guids_filter
+on splits.tx_guid = transaction_guids_filter.value
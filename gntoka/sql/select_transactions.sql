@@ -1 +1,3 @@
-SELECT * FROM transactions where post_date >= :start_date and post_date <= :end_date
+SELECT transactions.*, commodities.mnemonic as currency FROM transactions
+inner join commodities on transactions.currency_guid = commodities.guid
+where post_date >= :start_date and post_date <= :end_date
@@ -0,0 +1,8 @@
+SELECT transactions.*, commodities.mnemonic as currency FROM transactions
+inner join commodities on transactions.currency_guid = commodities.guid
+where post_date >= :start_date and post_date <= :end_date
+and transactions.guid in (
+    select splits.tx_guid from splits
+    inner join temp.account_guids_filter
+    on splits.account_guid = account_guids_filter.value
+)
@@ -0,0 +1,32 @@
+-- Numerators are totalled by denominator, so the division stays exact
+select coalesce(nullif(linked_accounts.code, ''), :no_account) as code
+, max(linked_accounts.name) as name
+, coalesce(
+    nullif(linked_accounts.supplementary_code, ''), :no_account
+) as supplementary_code
+, max(linked_accounts.supplementary_name) as supplementary_name
+, yen_splits.value_denom
+, sum(
+    case when yen_splits.value_num > 0 then yen_splits.value_num else 0 end
+) as debit
+, sum(
+    case when yen_splits.value_num < 0 then -yen_splits.value_num else 0 end
+) as credit
+from (
+    -- Splits of transactions in other currencies were converted into yen
+    select splits.account_guid
+    , coalesce(converted_values.value, splits.value_num) as value_num
+    , case
+        when converted_values.value is null then splits.value_denom
+        else 1
+    end as value_denom
+    from splits
+    inner join temp.transaction_guids_filter
+    on splits.tx_guid = transaction_guids_filter.value
+    left join temp.converted_values
+    on splits.guid = converted_values.guid
+) as yen_splits
+inner join temp.linked_accounts
+on yen_splits.account_guid = linked_accounts.guid
+group by 1, 3, 5
+order by 1, 3, 5
@@ -0,0 +1,165 @@
+"""Consumption tax rules.
+
+Rules are compiled into a TaxIndex once. For every account, the index holds
+the dates at which the applicable rule changes, so finding the rule for a
+split is a dictionary lookup followed by a binary search.
+"""
+from bisect import (
+    bisect_right,
+)
+from datetime import (
+    date,
+    timedelta,
+)
+from decimal import (
+    ROUND_DOWN,
+    Decimal,
+)
+from typing import (
+    Any,
+    List,
+    Mapping,
+    Optional,
+)
+
+from .constants import (
+    DEFAULT_CONSUMPTION_TAX_METHOD,
+)
+from .serialize import (
+    consumption_tax_rates,
+)
+from .types import (
+    Account,
+    AccountRule,
+    ConsumptionTax,
+    ConsumptionTaxRate,
+    DbContents,
+    Split,
+    TaxIndex,
+    TaxIntervals,
+    TaxRule,
+    TaxRules,
+)
+
+
+tax_rate_percentages: Mapping[ConsumptionTaxRate, Decimal] = {
+    ConsumptionTaxRate.ZERO: Decimal(0),
+    ConsumptionTaxRate.EIGHT_REDUCED: Decimal(8),
+    ConsumptionTaxRate.TEN: Decimal(10),
+}
+tax_rates_by_name: Mapping[str, ConsumptionTaxRate] = {
+    name: rate for rate, name in consumption_tax_rates.items()
+}
+
+
+def deserialize_tax_rule(rule: Mapping[str, Any]) -> TaxRule:
+    """Deserialize a rule from the tax_rules table in the configuration."""
+    return TaxRule(
+        tax_class=str(rule["tax_class"]),
+        rate=tax_rates_by_name[rule["rate"]],
+        consumption_tax_method=str(
+            rule.get("consumption_tax_method", DEFAULT_CONSUMPTION_TAX_METHOD)
+        ),
+        account_guids=tuple(rule.get("account_guids", ())),
+        account_codes=tuple(rule.get("account_codes", ())),
+        account_paths=tuple(rule.get("account_paths", ())),
+        start_date=rule.get("start_date"),
+        end_date=rule.get("end_date"),
+    )
+
+
+def matches_account(rule: AccountRule, account: Account, path: str) -> bool:
+    """Check whether a rule applies to an account."""
+    return (
+        account.guid in rule.account_guids
+        or account.code in rule.account_codes
+        or any(
+            path == rule_path or path.startswith(f"{rule_path}:")
+            for rule_path in rule.account_paths
+        )
+    )
+
+
+def compile_intervals(rules: TaxRules) -> TaxIntervals:
+    """Compile the rules of one account into non-overlapping intervals.
+
+    Where rules overlap, the first one applies.
+    """
+    boundaries = sorted(
+        {date.min}
+        | {rule.start_date for rule in rules if rule.start_date}
+        | {
+            rule.end_date + timedelta(days=1)
+            for rule in rules
+            if rule.end_date and rule.end_date < date.max
+        }
+    )
+    starts: List[date] = []
+    interval_rules: List[Optional[TaxRule]] = []
+    for start in boundaries:
+        rule = next(
+            (
+                rule
+                for rule in rules
+                if (rule.start_date or date.min)
+                <= start
+                <= (rule.end_date or date.max)
+            ),
+            None,
+        )
+        # Merge with the previous interval if nothing changes
+        if not interval_rules or interval_rules[-1] != rule:
+            starts.append(start)
+            interval_rules.append(rule)
+    return starts, interval_rules
+
+
+def compile_tax_index(rules: TaxRules, db_contents: DbContents) -> TaxIndex:
+    """Compile the rules for all accounts they apply to."""
+    index: TaxIndex = {}
+    for account in db_contents.account_store.values():
+        path = db_contents.account_paths.get(account.guid, "")
+        account_rules = [
+            rule for rule in rules if matches_account(rule, account, path)
+        ]
+        if account_rules:
+            index[account.guid] = compile_intervals(account_rules)
+    return index
+
+
+def find_tax_rule(
+    index: TaxIndex, account_guid: str, on: date
+) -> Optional[TaxRule]:
+    """Find the rule applying to an account on a date."""
+    intervals = index.get(account_guid)
+    if intervals is None:
+        return None
+    starts, rules = intervals
+    return rules[bisect_right(starts, on) - 1]
+
+
+def calculate_consumption_tax(
+    amount: Decimal, rate: ConsumptionTaxRate
+) -> Decimal:
+    """Calculate the tax included in an amount, rounding down to the Yen."""
+    percentage = tax_rate_percentages[rate]
+    return (amount * percentage / (100 + percentage)).quantize(
+        Decimal(1), rounding=ROUND_DOWN
+    )
+
+
+def find_consumption_tax(
+    index: TaxIndex, split: Optional[Split]
+) -> Optional[ConsumptionTax]:
+    """Find the consumption tax of a split, if any rule applies to it."""
+    if split is None:
+        return None
+    rule = find_tax_rule(index, split.account.guid, split.transaction.date)
+    if rule is None:
+        return None
+    return ConsumptionTax(
+        tax_class=rule.tax_class,
+        consumption_tax_method=rule.consumption_tax_method,
+        rate=rule.rate,
+        amount=calculate_consumption_tax(abs(split.value), rule.rate),
+    )
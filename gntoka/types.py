@@ -23,6 +23,13 @@ from typing import (
     Mapping,
     Optional,
     Set,
+    Tuple,
+    Union,
+)
+
+from .constants import (
+    DEFAULT_CONSUMPTION_TAX_METHOD,
+    YEN,
 )
 
 
@@ -38,6 +45,8 @@ class Account:
     name: str
     supplementary_code: Optional[str]
     supplementary_name: Optional[str]
+    # Amounts in the account are recorded in this commodity
+    commodity: str = YEN
 
 
 @dataclass
@@ -47,6 +56,20 @@ class Transaction:
     guid: str
     date: date
     description: Optional[str]
+    currency: str = YEN
+    # How the values were converted into yen, for the memo
+    conversion: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class Department:
+    """A Kaikeio department, with the sticky notes of its rows."""
+
+    code: str = "0"
+    name: str = ""
+    # "3" is blue
+    tag1: str = "3"
+    tag2: str = "0"
 
 
 @dataclass
@@ -58,6 +81,12 @@ class Split:
     transaction: Transaction
     memo: Optional[str]
     value: Decimal
+    # If this split combines others, their guids
+    combined_guids: Tuple[str, ...] = ()
+    # Resolved from the department rules, None means no department
+    department: Optional[Department] = None
+    # The amount in the commodity of the account, if known
+    quantity: Optional[Decimal] = None
 
 
 class ConsumptionTaxRate(enum.Enum):
@@ -68,6 +97,54 @@ class ConsumptionTaxRate(enum.Enum):
     TEN = enum.auto()
 
 
+@dataclass(frozen=True)
+class TaxRule:
+    """Assign a consumption tax to the splits of some accounts.
+
+    A rule applies to the accounts with one of the given guids, Kaikeio codes
+    or GnuCash account names. An account name includes its child accounts.
+    """
+
+    tax_class: str
+    rate: ConsumptionTaxRate
+    consumption_tax_method: str = DEFAULT_CONSUMPTION_TAX_METHOD
+    account_guids: Tuple[str, ...] = ()
+    account_codes: Tuple[str, ...] = ()
+    account_paths: Tuple[str, ...] = ()
+    # Inclusive, None means unbounded
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+
+
+@dataclass(frozen=True)
+class DepartmentRule:
+    """Assign Kaikeio departments to the splits of some accounts.
+
+    A rule applies to accounts like a TaxRule. The department is chosen by
+    the value of a GnuCash slot, taken from the split, its transaction or its
+    account, whichever has it first. Account notes are the slot "notes".
+    """
+
+    slot: str
+    # By slot value
+    departments: Mapping[str, Department]
+    # If none of them has the slot
+    default: Department = Department()
+    account_guids: Tuple[str, ...] = ()
+    account_codes: Tuple[str, ...] = ()
+    account_paths: Tuple[str, ...] = ()
+
+
+@dataclass(frozen=True)
+class ConsumptionTax:
+    """The consumption tax of one side of a journal entry."""
+
+    tax_class: str
+    consumption_tax_method: str
+    rate: ConsumptionTaxRate
+    amount: Decimal
+
+
 @dataclass
 class JournalEntry:
     """A journal entry."""
@@ -105,6 +182,48 @@ class JournalEntry:
     tag1: str
     tag2: str
     slip_type: str
+    # Where the entry came from, for the provenance index
+    transaction_guid: str = ""
+    split_guids: Tuple[str, ...] = ()
+
+
+class Snapshot(enum.Enum):
+    """Encode how the GnuCash book is opened."""
+
+    # Open the book directly
+    NONE = "none"
+    # Read the book through mmap, without taking any locks
+    IMMUTABLE = "immutable"
+    # Copy the book into memory with SQLite's backup API
+    BACKUP = "backup"
+
+
+class ColumnType(enum.Enum):
+    """Encode how a Kaikeio CSV column is serialized."""
+
+    NUMBER = enum.auto()
+    DATE = enum.auto()
+    TEXT = enum.auto()
+    AMOUNT = enum.auto()
+    TAX_RATE = enum.auto()
+    MEMO = enum.auto()
+
+
+@dataclass(frozen=True)
+class Column:
+    """A Kaikeio CSV column and the JournalEntry attribute it is read from."""
+
+    header: str
+    attribute: str
+    type: ColumnType
+    # Maximum length in bytes when encoded as Shift_JIS
+    max_length: Optional[int] = None
+    # Inclusive
+    bounds: Optional[Tuple[int, int]] = None
+    # Used when the attribute is empty
+    default: str = ""
+    # Text longer than this many characters is cut off and added to the memo
+    overflow: Optional[int] = None
 
 
 AccountStore = Dict[str, Account]
@@ -117,8 +236,60 @@ TransactionSplits = List[TransactionSplit]
 
 AccountNames = List[str]
 
+# Map texts from GnuCash to their cleaned up version
+CleanTexts = Dict[Optional[str], Optional[str]]
+
 JournalEntryCounter = Iterator[int]
 
+TaxRules = List[TaxRule]
+# For each account, the dates at which the applicable rule changes and the
+# rule applying from that date on
+TaxIntervals = Tuple[List[date], List[Optional[TaxRule]]]
+TaxIndex = Dict[str, TaxIntervals]
+
+DepartmentRules = List[DepartmentRule]
+DepartmentIndex = Dict[str, DepartmentRule]
+# Rules that select accounts
+AccountRule = Union[TaxRule, DepartmentRule]
+
+# GnuCash slot values by object guid and slot name
+Slots = Dict[str, Dict[str, str]]
+# Map account guids to full GnuCash account names
+AccountPaths = Dict[str, str]
+
+
+@dataclass(frozen=True)
+class Price:
+    """The price of a commodity in a currency on a date."""
+
+    commodity: str
+    currency: str
+    date: date
+    value: Decimal
+
+
+# For every currency, the dates of its prices in yen and the prices
+PriceIndex = Dict[str, Tuple[List[date], List[Decimal]]]
+
+
+@dataclass
+class AccountBalance:
+    """The debit and credit totals of a Kaikeio account."""
+
+    code: str
+    name: Optional[str]
+    supplementary_code: str
+    supplementary_name: Optional[str]
+    debit: Decimal
+    credit: Decimal
+
+
+TrialBalance = List[AccountBalance]
+# Kaikeio code and supplementary code
+BalanceKey = Tuple[str, str]
+# Debit and credit totals
+BalanceTotals = Dict[BalanceKey, Tuple[Decimal, Decimal]]
+
 
 @dataclass
 class Configuration:
@@ -130,6 +301,58 @@ class Configuration:
     # Inclusive
     end_date: date
     start_num: int
+    # Export only transactions touching these accounts or their children
+    account_links_csv: Optional[Path] = None
+    snapshot: Snapshot = Snapshot.NONE
+    # Remember slip numbers here, instead of counting up from start_num
+    slip_ledger: Optional[Path] = None
+    # The first matching rule applies
+    tax_rules: TaxRules = field(default_factory=list)
+    # The first matching rule applies
+    department_rules: DepartmentRules = field(default_factory=list)
+    # Combine the splits of a composite slip by account
+    aggregate_splits: bool = False
+    trial_balance_csv: Optional[Path] = None
+    # Map every row back to the splits it came from in this file
+    provenance_index: Optional[Path] = None
+    # Split journal_out_csv into files of at most this many rows or bytes
+    shard_rows: Optional[int] = None
+    shard_bytes: Optional[int] = None
+
+
+@dataclass
+class Shard:
+    """One of the files a journal is split into."""
+
+    path: Path
+    first_slip: str
+    last_slip: str
+    rows: int = 0
+    # In bytes, including the header
+    size: int = 0
+    # The encoded header and slips, until they are written
+    chunks: List[bytes] = field(default_factory=list)
+
+
+@dataclass
+class RowChange:
+    """A journal row that Kaikeio holds differently."""
+
+    expected: CsvRow
+    actual: CsvRow
+    # Headers of the columns that differ
+    columns: List[str]
+
+
+@dataclass
+class Reconciliation:
+    """Differences between the journal and the rows Kaikeio holds."""
+
+    # In the journal, but not in Kaikeio
+    missing: List[CsvRow] = field(default_factory=list)
+    # In Kaikeio, but not in the journal
+    extra: List[CsvRow] = field(default_factory=list)
+    changed: List[RowChange] = field(default_factory=list)
 
 
 @dataclass
@@ -138,7 +361,12 @@ class DbContents:
 
     account_store: AccountStore
     transaction_store: TransactionStore
+    account_paths: AccountPaths = field(default_factory=dict)
     split_store: SplitStore = field(default_factory=dict)
     transaction_splits: Dict[str, List[Split]] = field(
         default_factory=lambda: defaultdict(list)
     )
+    # Only the slots the department rules need
+    slots: Slots = field(default_factory=dict)
+    # Only computed if requested, and only for SQLite books
+    trial_balance: Optional[TrialBalance] = None
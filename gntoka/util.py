@@ -3,6 +3,7 @@ from datetime import (
     date,
 )
 from typing import (
+    Dict,
     Iterable,
     Optional,
 )
@@ -10,6 +11,7 @@ from typing import (
 import mojimoji
 
 from .types import (
+    CleanTexts,
     Split,
 )
 
@@ -29,23 +31,85 @@ def get_credits(splits: Iterable[Split]) -> Iterable[Split]:
     return filter(lambda split: split.value < 0, splits)
 
 
+TEXT_TRANSLATION = str.maketrans(
+    {
+        "\xa0": " ",
+        "　": " ",
+    },
+)
+# Used to join texts that are cleaned together. Cleaning leaves it untouched.
+TEXT_SEPARATOR = "\x00"
+
+
+def normalize_text(txt: str) -> str:
+    """Replace characters that Kaikeio does not like."""
+    replaced = txt.translate(TEXT_TRANSLATION)
+    # Ensure we can still get this to shift-jis
+    replaced = mojimoji.zen_to_han(replaced)
+    assert replaced.encode("shift-jis")
+    return replaced
+
+
 def clean_text(txt: Optional[str]) -> Optional[str]:
     """Remove or replace characters that Kaikeio does not like."""
     if not txt:
         return None
-    tr = str.maketrans(
-        {
-            "\xa0": " ",
-            "　": " ",
-        },
+    return normalize_text(txt)
+
+
+def clean_texts(txts: Iterable[Optional[str]]) -> CleanTexts:
+    """Clean many texts at once.
+
+    Every distinct text is cleaned only once, and all of them are normalized
+    in a single pass. Look up the result with .get(), which gives None for
+    empty texts, just like clean_text.
+    """
+    distinct = list({txt for txt in txts if txt})
+    if not distinct:
+        return {}
+    cleaned = normalize_text(TEXT_SEPARATOR.join(distinct)).split(
+        TEXT_SEPARATOR
     )
-    replaced = txt.translate(tr)
-    # Ensure we can still get this to shift-jis
-    replaced = mojimoji.zen_to_han(replaced)
-    assert replaced.encode("shift-jis")
-    return replaced
+    assert len(cleaned) == len(distinct), "Texts must not contain NUL"
+    return dict(zip(distinct, cleaned))
 
 
 def length_sjis(txt: str) -> int:
     """Validate the length of a string when converted to Shift_JIS."""
     return len(txt.encode("shift-jis"))
+
+
+class SjisLengths(Dict[str, int]):
+    """Map strings to their length in Shift_JIS.
+
+    Each string is only encoded the first time its length is looked up, so
+    only use it for repeated strings like account and department names.
+    """
+
+    def __missing__(self, txt: str) -> int:
+        """Encode a string we haven't seen yet."""
+        length = self[txt] = length_sjis(txt)
+        return length
+
+
+def truncate_sjis(txt: str, max_length: int) -> str:
+    """Cut a string to at most max_length bytes in Shift_JIS."""
+    encoded = txt.encode("shift-jis")
+    if len(encoded) <= max_length:
+        return txt
+    # Drop a double-byte character that was cut in half
+    return encoded[:max_length].decode("shift-jis", errors="ignore")
+
+
+def fits_sjis(
+    txt: str, max_length: int, lengths: Optional[SjisLengths] = None
+) -> bool:
+    """Check that a string is at most max_length bytes long in Shift_JIS.
+
+    Shift_JIS uses at most two bytes per character, so short strings do not
+    need to be encoded. Longer ones are looked up in lengths if given.
+    """
+    if len(txt) * 2 <= max_length:
+        return True
+    length = length_sjis(txt) if lengths is None else lengths[txt]
+    return length <= max_length
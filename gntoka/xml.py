@@ -0,0 +1,449 @@
+"""Read GnuCash books saved in the XML format.
+
+The book is parsed incrementally, so only the accounts and the transactions
+we export are kept in memory.
+"""
+import gzip
+from datetime import (
+    date,
+    datetime,
+    timezone,
+)
+from decimal import (
+    Decimal,
+)
+from itertools import (
+    chain,
+)
+from pathlib import (
+    Path,
+)
+from typing import (
+    AbstractSet,
+    BinaryIO,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    TypedDict,
+    cast,
+)
+from xml.etree.ElementTree import (
+    Element,
+    iterparse,
+)
+
+from . import (
+    currency,
+    util,
+)
+from .constants import (
+    YEN,
+)
+from .serialize import (
+    AccountDict,
+    deserialize_account,
+    deserialize_transaction,
+)
+from .types import (
+    AccountIds,
+    AccountNames,
+    AccountPaths,
+    AccountStore,
+    CleanTexts,
+    DbContents,
+    Price,
+    Slots,
+    Split,
+    TransactionSplit,
+)
+
+
+GNC = "{http://www.gnucash.org/XML/gnc}"
+ACT = "{http://www.gnucash.org/XML/act}"
+TRN = "{http://www.gnucash.org/XML/trn}"
+SPLIT = "{http://www.gnucash.org/XML/split}"
+TS = "{http://www.gnucash.org/XML/ts}"
+SLOT = "{http://www.gnucash.org/XML/slot}"
+PRICE = "{http://www.gnucash.org/XML/price}"
+CMDTY = "{http://www.gnucash.org/XML/cmdty}"
+
+GZIP_MAGIC = b"\x1f\x8b"
+XML_MAGIC = b"<?xml"
+UTC_SUFFIX = " +0000"
+# The accounts and transactions of a book are at this depth
+BOOK_CHILD_DEPTH = 3
+
+
+class XmlAccountDict(TypedDict):
+    """Encode a GnuCash account as stored in the XML file."""
+
+    guid: str
+    name: str
+    code: Optional[str]
+    parent_guid: Optional[str]
+    placeholder: bool
+    commodity: Optional[str]
+
+
+XmlAccounts = Dict[str, XmlAccountDict]
+
+
+def is_xml_book(path: Path) -> bool:
+    """Check whether a GnuCash book is saved as (compressed) XML."""
+    with path.open("rb") as fd:
+        magic = fd.read(len(XML_MAGIC))
+    return magic.startswith(GZIP_MAGIC) or magic == XML_MAGIC
+
+
+def open_book(path: Path) -> BinaryIO:
+    """Open a GnuCash XML book, decompressing it on the fly if needed."""
+    with path.open("rb") as fd:
+        compressed = fd.read(len(GZIP_MAGIC)) == GZIP_MAGIC
+    if compressed:
+        return cast(BinaryIO, gzip.open(path, "rb"))
+    return path.open("rb")
+
+
+def iter_book(fd: BinaryIO) -> Iterator[Element]:
+    """Yield the accounts, transactions and so on of a book one by one.
+
+    Each element is cleared after it has been processed.
+    """
+    depth = 0
+    parent = None
+    for event, element in iterparse(fd, events=("start", "end")):
+        if event == "start":
+            depth += 1
+            if depth == BOOK_CHILD_DEPTH - 1:
+                parent = element
+            continue
+        depth -= 1
+        if depth == BOOK_CHILD_DEPTH - 1:
+            yield element
+            assert parent is not None
+            parent.clear()
+
+
+def parse_account(element: Element) -> XmlAccountDict:
+    """Parse a gnc:account element."""
+    placeholder = any(
+        slot.findtext(f"{SLOT}key") == "placeholder"
+        and slot.findtext(f"{SLOT}value") == "true"
+        for slot in element.iterfind(f"{ACT}slots/slot")
+    )
+    return {
+        "guid": element.findtext(f"{ACT}id", ""),
+        "name": element.findtext(f"{ACT}name", ""),
+        "code": element.findtext(f"{ACT}code"),
+        "parent_guid": element.findtext(f"{ACT}parent"),
+        "placeholder": placeholder,
+        "commodity": element.findtext(f"{ACT}commodity/{CMDTY}id"),
+    }
+
+
+def read_slots(
+    element: Element,
+    path: str,
+    guid: str,
+    names: AbstractSet[str],
+    slots: Slots,
+) -> None:
+    """Remember the named slots of a GnuCash object.
+
+    Like get_slots, this only reads the slots at the top level.
+    """
+    for slot in element.iterfind(path):
+        name = slot.findtext(f"{SLOT}key", "")
+        if name in names:
+            slots.setdefault(guid, {})[name] = slot.findtext(
+                f"{SLOT}value", ""
+            )
+
+
+def link_account(
+    account: XmlAccountDict, parent: XmlAccountDict
+) -> AccountDict:
+    """Link an account with Kaikeio information.
+
+    This does the same as select_accounts.sql.
+    """
+    if parent["placeholder"]:
+        return {
+            "guid": account["guid"],
+            "code": account["code"] or "",
+            "name": account["name"],
+            "supplementary_code": None,
+            "supplementary_name": None,
+            "commodity": account["commodity"],
+        }
+    return {
+        "guid": account["guid"],
+        "code": parent["code"] or "",
+        "name": parent["name"],
+        "supplementary_code": account["code"] or "",
+        "supplementary_name": account["name"],
+        "commodity": account["commodity"],
+    }
+
+
+def build_account_store(accounts: XmlAccounts) -> AccountStore:
+    """Build the account store from the accounts read so far."""
+    linked = [
+        link_account(account, accounts[account["parent_guid"]])
+        for account in accounts.values()
+        if account["parent_guid"] in accounts and not account["placeholder"]
+    ]
+    texts = util.clean_texts(
+        account["supplementary_name"] for account in linked
+    )
+    return {
+        account["guid"]: deserialize_account(account, texts)
+        for account in linked
+    }
+
+
+def account_paths(accounts: XmlAccounts) -> AccountPaths:
+    """Get the full name of every account, like "Expenses:Dining"."""
+    paths: AccountPaths = {}
+
+    def path(guid: str) -> str:
+        if guid not in paths:
+            account = accounts[guid]
+            parent_guid = account["parent_guid"]
+            paths[guid] = (
+                f"{path(parent_guid)}:{account['name']}"
+                if parent_guid and accounts[parent_guid]["parent_guid"]
+                else account["name"]
+            )
+        return paths[guid]
+
+    for guid, account in accounts.items():
+        if account["parent_guid"]:
+            path(guid)
+    return paths
+
+
+def get_account_subtrees(
+    accounts: XmlAccounts, subtree_paths: AccountNames
+) -> AccountIds:
+    """Get the guids of the accounts below and including the given paths."""
+    paths = account_paths(accounts)
+    missing = set(subtree_paths) - set(paths.values())
+    if missing:
+        raise ValueError(
+            f"Expected to find GnuCash accounts for {sorted(missing)}"
+        )
+    prefixes = tuple(f"{path}:" for path in subtree_paths)
+    return {
+        guid
+        for guid, path in paths.items()
+        if path in subtree_paths or path.startswith(prefixes)
+    }
+
+
+def parse_timestamp(timestamp: str) -> str:
+    """Parse a timestamp, like "2023-01-31 10:59:00 +0900", into UTC.
+
+    This gives the same format as the timestamp columns in SQLite books.
+    """
+    # Recent GnuCash versions write all timestamps in UTC
+    if timestamp.endswith(UTC_SUFFIX):
+        return timestamp[: -len(UTC_SUFFIX)]
+    return (
+        datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S %z")
+        .astimezone(timezone.utc)
+        .strftime("%Y-%m-%d %H:%M:%S")
+    )
+
+
+def parse_post_date(element: Element) -> str:
+    """Parse when a transaction was posted as a UTC timestamp."""
+    return parse_timestamp(element.findtext(f"{TRN}date-posted/{TS}date", ""))
+
+
+def parse_price(element: Element) -> Price:
+    """Parse a price element of the gnc:pricedb."""
+    timestamp = parse_timestamp(element.findtext(f"{PRICE}time/{TS}date", ""))
+    return Price(
+        commodity=element.findtext(f"{PRICE}commodity/{CMDTY}id", ""),
+        currency=element.findtext(f"{PRICE}currency/{CMDTY}id", ""),
+        date=date.fromisoformat(timestamp.split(" ")[0]),
+        value=parse_value(element.findtext(f"{PRICE}value", "0/1")),
+    )
+
+
+def parse_value(txt: str) -> Decimal:
+    """Parse a GnuCash fraction, like "-1500/1"."""
+    numerator, denominator = txt.split("/")
+    return Decimal(numerator) / Decimal(denominator)
+
+
+def clean_cached(texts: CleanTexts, txt: Optional[str]) -> Optional[str]:
+    """Clean a text, remembering the result in texts."""
+    if txt not in texts:
+        texts[txt] = util.clean_text(txt)
+    return texts[txt]
+
+
+def parse_splits(
+    element: Element,
+    account_store: AccountStore,
+    texts: CleanTexts,
+    slot_names: AbstractSet[str],
+    slots: Slots,
+) -> TransactionSplit:
+    """Parse a gnc:transaction element into its splits.
+
+    The named slots of the transaction and its splits are added to slots.
+    """
+    description = element.findtext(f"{TRN}description", "")
+    clean_cached(texts, description)
+    transaction = deserialize_transaction(
+        {
+            "guid": element.findtext(f"{TRN}id", ""),
+            "post_date": parse_post_date(element),
+            "description": description,
+            "currency": element.findtext(f"{TRN}currency/{CMDTY}id", YEN),
+        },
+        texts,
+    )
+    read_slots(
+        element, f"{TRN}slots/slot", transaction.guid, slot_names, slots
+    )
+    splits = []
+    for split in element.iterfind(f"{TRN}splits/{TRN}split"):
+        account_guid = split.findtext(f"{SPLIT}account", "")
+        account = account_store.get(account_guid)
+        if account is None:
+            raise ValueError(
+                f"Expected to find account for split in {transaction} with "
+                f"account_guid {account_guid} among the imported GnuCash "
+                "accounts"
+            )
+        guid = split.findtext(f"{SPLIT}id", "")
+        read_slots(split, f"{SPLIT}slots/slot", guid, slot_names, slots)
+        splits.append(
+            Split(
+                guid=guid,
+                account=account,
+                transaction=transaction,
+                memo=clean_cached(texts, split.findtext(f"{SPLIT}memo")),
+                value=parse_value(split.findtext(f"{SPLIT}value", "0/1")),
+                quantity=parse_value(
+                    split.findtext(f"{SPLIT}quantity", "0/1")
+                ),
+            )
+        )
+    return splits
+
+
+def read_accounts(
+    elements: Iterator[Element],
+    slot_names: AbstractSet[str],
+    slots: Slots,
+) -> Tuple[XmlAccounts, List[Price], Iterator[Element]]:
+    """Read all accounts and prices, up to the first transaction.
+
+    Return the accounts, the prices and the remaining elements. The named
+    slots of the accounts are added to slots.
+    """
+    accounts: XmlAccounts = {}
+    prices: List[Price] = []
+    for element in elements:
+        if element.tag == f"{GNC}transaction":
+            return accounts, prices, chain([element], elements)
+        if element.tag == f"{GNC}account":
+            account = parse_account(element)
+            accounts[account["guid"]] = account
+            read_slots(
+                element, f"{ACT}slots/slot", account["guid"], slot_names, slots
+            )
+        elif element.tag == f"{GNC}pricedb":
+            prices += map(parse_price, element.iterfind("price"))
+    return accounts, prices, iter([])
+
+
+def is_selected(
+    element: Element,
+    start_date: date,
+    end_date: date,
+    account_ids: Optional[AccountIds],
+) -> bool:
+    """Check whether to export a transaction, without parsing all of it."""
+    if element.tag != f"{GNC}transaction":
+        return False
+    post_date = date.fromisoformat(parse_post_date(element).split(" ")[0])
+    if not start_date <= post_date <= end_date:
+        return False
+    return account_ids is None or any(
+        account_guid in account_ids
+        for account_guid in split_account_guids(element)
+    )
+
+
+def split_account_guids(element: Element) -> Iterable[str]:
+    """Get the accounts of all splits of a transaction."""
+    return (
+        split.findtext(f"{SPLIT}account", "")
+        for split in element.iterfind(f"{TRN}splits/{TRN}split")
+    )
+
+
+def read_book(
+    path: Path,
+    start_date: date,
+    end_date: date,
+    subtree_paths: Optional[AccountNames] = None,
+    slot_names: AbstractSet[str] = frozenset(),
+) -> DbContents:
+    """Read all accounts and the transactions we export from a book.
+
+    Transactions are only exported if they were posted between start_date
+    and end_date, both inclusive. If subtree_paths is given, transactions
+    also need a split in one of these accounts or their children.
+    Transactions in other currencies are converted into yen. The slots named
+    in slot_names are kept.
+    """
+    texts: CleanTexts = {}
+    slots: Slots = {}
+    with open_book(path) as fd:
+        accounts, prices, elements = read_accounts(
+            iter_book(fd), slot_names, slots
+        )
+        account_store = build_account_store(accounts)
+        account_ids = (
+            None
+            if subtree_paths is None
+            else get_account_subtrees(accounts, subtree_paths)
+        )
+        db_contents = DbContents(
+            account_store=account_store,
+            transaction_store={},
+            account_paths=account_paths(accounts),
+            slots=slots,
+        )
+        for element in elements:
+            if is_selected(element, start_date, end_date, account_ids):
+                add_transaction_splits(
+                    db_contents,
+                    parse_splits(
+                        element, account_store, texts, slot_names, slots
+                    ),
+                )
+    currency.convert_to_yen(db_contents, currency.build_price_index(prices))
+    return db_contents
+
+
+def add_transaction_splits(
+    db_contents: DbContents, splits: TransactionSplit
+) -> None:
+    """Store a transaction and its splits."""
+    for split in splits:
+        db_contents.transaction_store[
+            split.transaction.guid
+        ] = split.transaction
+        db_contents.split_store[split.guid] = split
+        db_contents.transaction_splits[split.transaction.guid].append(split)
@@ -1,33 +1,62 @@
 #!/usr/bin/env python3
 """Main module."""
 import argparse
+import sys
 from itertools import (
     count,
 )
 from pathlib import (
     Path,
 )
+from typing import (
+    Optional,
+    cast,
+)
 
-import toml
 from gntoka import (
+    balance,
+    currency,
     db,
+    department,
     journal,
+    ledger,
+    provenance,
+    reconcile,
+    serialize,
+    tax,
+    xml,
+)
+from gntoka.config import (
+    load_configuration,
 )
 from gntoka.csv import (
+    read_account_paths,
     write_journal_entries,
+    write_trial_balance,
 )
 from gntoka.db import (
+    get_account_paths,
+    get_account_subtrees,
     get_accounts,
+    get_prices,
+    get_slots,
     get_splits,
     get_transactions,
+    get_trial_balance,
 )
 from gntoka.types import (
     Configuration,
+    CsvRow,
     DbContents,
     JournalEntries,
     JournalEntryCounter,
+    Reconciliation,
+    TaxIndex,
     TransactionSplits,
 )
+from gntoka.util import (
+    SjisLengths,
+)
 
 
 # TODO when we receive all splits in one big query (instead of 3) from the db,
@@ -40,63 +69,221 @@ def populate_transaction_splits(db_contents: DbContents) -> None:
 
 def build_journal(
     transaction_splits_values: TransactionSplits,
-    start_num: int,
+    counter: JournalEntryCounter,
+    taxes: TaxIndex,
+    aggregate: bool = False,
 ) -> JournalEntries:
     """Build a journal."""
     account_journal: JournalEntries = []
 
-    counter: JournalEntryCounter = count(start=start_num)
-
     # TODO we could rewrite this as a sorted(.flatten)
     for tx in transaction_splits_values:
-        account_journal += journal.build_journal_entries(counter, tx)
+        account_journal += journal.build_journal_entries(
+            counter, tx, taxes, aggregate
+        )
 
     account_journal.sort(key=lambda a: a.slip_date)
     return account_journal
 
 
-def main(config: Configuration) -> None:
-    """Run program."""
+def make_counter(
+    config: Configuration,
+    transaction_splits_values: TransactionSplits,
+    reserve: bool = True,
+) -> JournalEntryCounter:
+    """Give out a slip number for each transaction.
+
+    Unless reserve is set, new slip numbers are not written to the ledger.
+    """
+    if config.slip_ledger is None:
+        return count(start=config.start_num)
+    con = (
+        ledger.open_ledger(config.slip_ledger)
+        if reserve
+        else ledger.open_ledger_read_only(config.slip_ledger)
+    )
+    allocate = (
+        ledger.allocate_slip_numbers
+        if reserve
+        else ledger.preview_slip_numbers
+    )
+    slip_numbers = allocate(
+        con,
+        [tx[0].transaction.guid for tx in transaction_splits_values],
+        config.start_num,
+    )
+    for first, last in ledger.find_gaps(con):
+        print(
+            f"Slip numbers {first} to {last} are missing from the ledger",
+            file=sys.stderr,
+        )
+    con.close()
+    return iter(slip_numbers)
+
+
+def read_sqlite_book(config: Configuration) -> DbContents:
+    """Read a GnuCash book saved as SQLite."""
     con = db.open_connection(config)
 
+    account_ids = (
+        get_account_subtrees(con, read_account_paths(config.account_links_csv))
+        if config.account_links_csv
+        else None
+    )
     db_contents = DbContents(
         account_store=get_accounts(con),
+        account_paths=get_account_paths(con),
         transaction_store=get_transactions(
             con,
             config.start_date,
             config.end_date,
+            account_ids,
         ),
     )
     get_splits(con, db_contents)
     populate_transaction_splits(db_contents)
+    converted = currency.convert_to_yen(db_contents, get_prices(con))
+    if config.department_rules:
+        db_contents.slots = get_slots(
+            con, department.slot_names(config.department_rules)
+        )
+    if config.trial_balance_csv:
+        db_contents.trial_balance = get_trial_balance(con, converted)
+    return db_contents
+
+
+def read_xml_book(config: Configuration) -> DbContents:
+    """Read a GnuCash book saved as XML."""
+    if config.trial_balance_csv:
+        raise ValueError(
+            "Expected a SQLite book, since the trial balance is computed "
+            "in SQL"
+        )
+    return xml.read_book(
+        config.gnucash_db,
+        config.start_date,
+        config.end_date,
+        read_account_paths(config.account_links_csv)
+        if config.account_links_csv
+        else None,
+        department.slot_names(config.department_rules),
+    )
+
 
+def read_book(config: Configuration) -> DbContents:
+    """Read the GnuCash book, whichever format it is saved in."""
+    if xml.is_xml_book(config.gnucash_db):
+        return read_xml_book(config)
+    return read_sqlite_book(config)
+
+
+def build_account_journal(
+    config: Configuration, db_contents: DbContents, reserve: bool = True
+) -> JournalEntries:
+    """Build the journal from the transactions read.
+
+    Unless reserve is set, new slip numbers are not written to the ledger.
+    """
+    department.assign_departments(config.department_rules, db_contents)
     transaction_splits_values: TransactionSplits
     transaction_splits_values = sorted(
         db_contents.transaction_splits.values(),
         key=lambda tx: tx[0].transaction.date,
     )
 
-    account_journal: JournalEntries = build_journal(
-        transaction_splits_values, config.start_num
+    account_journal = build_journal(
+        transaction_splits_values,
+        make_counter(config, transaction_splits_values, reserve),
+        tax.compile_tax_index(config.tax_rules, db_contents),
+        config.aggregate_splits,
     )
-    write_journal_entries(config, account_journal)
+    if config.aggregate_splits:
+        report_aggregation(transaction_splits_values, account_journal)
+    return account_journal
+
+
+def report_aggregation(
+    transaction_splits_values: TransactionSplits,
+    account_journal: JournalEntries,
+) -> None:
+    """Print how many rows aggregating splits saved."""
+    rows = sum(
+        journal.count_journal_entries(tx) for tx in transaction_splits_values
+    )
+    saved = rows - len(account_journal)
+    print(
+        f"Aggregating splits saved {saved} of {rows} rows",
+        file=sys.stderr,
+    )
+
+
+def reconcile_journal(
+    config: Configuration, account_journal: JournalEntries, kaikeio_csv: Path
+) -> bool:
+    """Print how Kaikeio differs from the journal.
+
+    Kaikeio rows outside the exported period are ignored. Return whether
+    they are the same.
+    """
+    lengths = SjisLengths()
+    reconciliation = reconcile.reconcile(
+        (
+            cast(CsvRow, serialize.serialize_journal_entry(entry, lengths))
+            for entry in account_journal
+        ),
+        kaikeio_csv,
+        config.start_date,
+        config.end_date,
+    )
+    for line in reconcile.format_reconciliation(reconciliation):
+        print(line)
+    return reconciliation == Reconciliation()
+
+
+def write_journal(
+    config: Configuration,
+    db_contents: DbContents,
+    account_journal: JournalEntries,
+) -> None:
+    """Write the journal, and the index and trial balance if requested.
+
+    The journal is checked against the trial balance.
+    """
+    totals = write_journal_entries(config, account_journal)
+    if config.provenance_index:
+        provenance.write_index(config.provenance_index, account_journal)
+    if config.trial_balance_csv is None:
+        return
+    assert db_contents.trial_balance is not None
+    write_trial_balance(config.trial_balance_csv, db_contents.trial_balance)
+    balance.check_trial_balance(db_contents.trial_balance, totals)
+
+
+def main(config: Configuration, kaikeio_csv: Optional[Path] = None) -> None:
+    """Run program.
+
+    If kaikeio_csv is given, compare it with the journal instead of writing
+    the journal.
+    """
+    db_contents = read_book(config)
+    # Reconciling only reads the slip ledger
+    account_journal = build_account_journal(
+        config, db_contents, reserve=kaikeio_csv is None
+    )
+    if kaikeio_csv is None:
+        write_journal(config, db_contents, account_journal)
+    elif not reconcile_journal(config, account_journal, kaikeio_csv):
+        sys.exit(1)
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("config")
-    args = parser.parse_args()
-    config_path = Path(args.config)
-    with config_path.open() as fd:
-        config_dict = toml.load(fd)
-    config_path_parent = config_path.parent
-    configuration = Configuration(
-        gnucash_db=Path(config_path_parent / config_dict["gnucash_db"]),
-        journal_out_csv=Path(
-            config_path_parent / config_dict["journal_out_csv"]
-        ),
-        start_date=config_dict["start_date"],
-        end_date=config_dict["end_date"],
-        start_num=config_dict["start_num"],
+    parser.add_argument(
+        "--reconcile",
+        metavar="KAIKEIO_CSV",
+        type=Path,
+        help="compare with a journal exported from Kaikeio",
     )
-    main(configuration)
+    args = parser.parse_args()
+    main(load_configuration(Path(args.config)), args.reconcile)
@@ -0,0 +1,63 @@
+"""Test balance."""
+from decimal import (
+    Decimal,
+)
+from typing import (
+    cast,
+)
+
+import pytest
+from gntoka import (
+    balance,
+)
+from gntoka.serialize import (
+    JournalEntryDict,
+)
+from gntoka.types import (
+    AccountBalance,
+    BalanceTotals,
+)
+
+
+TRIAL_BALANCE = [
+    AccountBalance("100", "現金", "0", None, Decimal(300), Decimal(100)),
+    AccountBalance("500", "売上高", "1", "雑収入", Decimal(0), Decimal(200)),
+]
+
+
+def make_row(
+    debit_code: str, debit_amount: str, credit_code: str, credit_amount: str
+) -> JournalEntryDict:
+    """Make a serialized journal row with the columns we total."""
+    return cast(
+        JournalEntryDict,
+        {
+            "借方科目コード": debit_code,
+            "借方補助コード": "0",
+            "借方金額": debit_amount,
+            "貸方科目コード": credit_code,
+            "貸方補助コード": "0" if credit_code == "100" else "1",
+            "貸方金額": credit_amount,
+        },
+    )
+
+
+def test_add_journal_row() -> None:
+    """Test that the journal totals match the trial balance."""
+    totals: BalanceTotals = {}
+    balance.add_journal_row(totals, make_row("100", "200", "500", "200"))
+    balance.add_journal_row(totals, make_row("100", "100", "0", "0"))
+    balance.add_journal_row(totals, make_row("0", "0", "100", "100"))
+    assert totals == {
+        ("100", "0"): (Decimal(300), Decimal(100)),
+        ("500", "1"): (Decimal(0), Decimal(200)),
+    }
+    balance.check_trial_balance(TRIAL_BALANCE, totals)
+
+
+def test_check_trial_balance() -> None:
+    """Test that a mismatch names the account."""
+    totals: BalanceTotals = {}
+    balance.add_journal_row(totals, make_row("100", "300", "500", "200"))
+    with pytest.raises(ValueError, match="100-0"):
+        balance.check_trial_balance(TRIAL_BALANCE, totals)
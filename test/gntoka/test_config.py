@@ -0,0 +1,33 @@
+"""Test config."""
+from datetime import (
+    date,
+)
+from pathlib import (
+    Path,
+)
+
+from gntoka import (
+    config,
+)
+from gntoka.types import (
+    Configuration,
+    Snapshot,
+)
+
+
+TEST_DATA = Path("test/data")
+
+
+def test_load_configuration() -> None:
+    """Test that paths are relative to the configuration file."""
+    assert config.load_configuration(
+        TEST_DATA / "config.toml"
+    ) == Configuration(
+        gnucash_db=TEST_DATA / "journal.gnucash",
+        journal_out_csv=TEST_DATA / "journal.csv",
+        start_date=date(2023, 1, 1),
+        end_date=date(2023, 12, 31),
+        start_num=1337,
+        account_links_csv=TEST_DATA / "account_links.csv",
+        snapshot=Snapshot.NONE,
+    )
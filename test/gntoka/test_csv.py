@@ -0,0 +1,150 @@
+"""Test csv."""
+import csv
+from dataclasses import (
+    replace,
+)
+from datetime import (
+    date,
+)
+from decimal import (
+    Decimal,
+)
+from pathlib import (
+    Path,
+)
+from typing import (
+    Iterable,
+    Iterator,
+    List,
+)
+
+import pytest
+from gntoka import (
+    journal,
+)
+from gntoka.csv import (
+    plan_shards,
+    shard_manifest_path,
+    write_journal_entries,
+    write_shard,
+)
+from gntoka.serialize import (
+    JournalEntryDict,
+)
+from gntoka.types import (
+    Account,
+    Configuration,
+    JournalEntries,
+    Shard,
+)
+
+
+CASH = Account("cash", "100", "現金", None, None)
+
+
+def make_entries() -> JournalEntries:
+    """Make slips with one, two and three lines."""
+    return [
+        journal.make_journal_entry(
+            slip_number=slip,
+            line_number=line,
+            slip_date=date(2023, 1, 31),
+            debit_account=CASH,
+            credit_account=None,
+            debit_amount=Decimal(100),
+            credit_amount=None,
+            description="売上",
+            description_supplementary=None,
+        )
+        for slip in range(1, 4)
+        for line in range(1, slip + 1)
+    ]
+
+
+@pytest.fixture
+def config(tmp_path: Path) -> Configuration:
+    """Configure writing into tmp_path."""
+    return Configuration(
+        gnucash_db=tmp_path / "journal.gnucash",
+        journal_out_csv=tmp_path / "journal.csv",
+        start_date=date(2023, 1, 1),
+        end_date=date(2023, 12, 31),
+        start_num=1,
+    )
+
+
+def read_lines(path: Path) -> List[str]:
+    """Read the lines of a journal."""
+    return path.read_bytes().decode("shift_jis").splitlines()
+
+
+def test_write_journal_entries_shards(config: Configuration) -> None:
+    """Test that shards keep slips whole and concatenate to the journal."""
+    write_journal_entries(config, make_entries())
+    header, *rows = read_lines(config.journal_out_csv)
+    write_journal_entries(replace(config, shard_rows=3), make_entries())
+    shard_paths = sorted(config.journal_out_csv.parent.glob("journal-0*"))
+    shards = [read_lines(path) for path in shard_paths]
+    assert [shard[0] for shard in shards] == [header, header]
+    assert [len(shard) - 1 for shard in shards] == [3, 3]
+    assert [row for shard in shards for row in shard[1:]] == rows
+    with shard_manifest_path(config.journal_out_csv).open() as fd:
+        manifest = list(csv.DictReader(fd))
+    assert [
+        (row["file"], row["first_slip"], row["last_slip"]) for row in manifest
+    ] == [("journal-001.csv", "1", "2"), ("journal-002.csv", "3", "3")]
+
+
+def test_write_journal_entries_shard_bytes(config: Configuration) -> None:
+    """Test that a slip larger than the limit gets a shard of its own."""
+    write_journal_entries(replace(config, shard_bytes=1), make_entries())
+    with shard_manifest_path(config.journal_out_csv).open() as fd:
+        manifest = list(csv.DictReader(fd))
+    assert [int(row["rows"]) for row in manifest] == [1, 2, 3]
+    for row in manifest:
+        path = config.journal_out_csv.parent / row["file"]
+        assert path.stat().st_size == int(row["bytes"])
+
+
+def test_write_journal_entries_stale_shards(config: Configuration) -> None:
+    """Test that shards of an earlier, larger export are removed."""
+    write_journal_entries(replace(config, shard_bytes=1), make_entries())
+    notes = config.journal_out_csv.with_name("journal-notes.csv")
+    notes.touch()
+    write_journal_entries(replace(config, shard_rows=3), make_entries())
+    assert sorted(
+        path.name for path in config.journal_out_csv.parent.iterdir()
+    ) == [
+        "journal-001.csv",
+        "journal-002.csv",
+        "journal-manifest.csv",
+        "journal-notes.csv",
+    ]
+
+
+def test_write_journal_entries_backpressure(
+    config: Configuration, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test that only a few shards wait to be written at a time."""
+    planned: List[Shard] = []
+    written: List[Shard] = []
+
+    def plan(
+        config: Configuration,
+        slips: Iterable[List[JournalEntryDict]],
+        header: bytes,
+    ) -> Iterator[Shard]:
+        for shard in plan_shards(config, slips, header):
+            planned.append(shard)
+            assert len(planned) - len(written) <= 2
+            yield shard
+
+    def write(shard: Shard) -> Shard:
+        written.append(write_shard(shard))
+        return shard
+
+    monkeypatch.setattr("gntoka.csv.WRITER_THREADS", 1)
+    monkeypatch.setattr("gntoka.csv.plan_shards", plan)
+    monkeypatch.setattr("gntoka.csv.write_shard", write)
+    write_journal_entries(replace(config, shard_bytes=1), make_entries())
+    assert len(written) == 3
@@ -0,0 +1,120 @@
+"""Test currency."""
+from datetime import (
+    date,
+)
+from decimal import (
+    Decimal,
+)
+
+import pytest
+from gntoka import (
+    currency,
+)
+from gntoka.types import (
+    Account,
+    DbContents,
+    Price,
+    Split,
+    Transaction,
+)
+
+
+PRICES = currency.build_price_index(
+    [
+        Price("USD", "JPY", date(2023, 1, 30), Decimal("150.55")),
+        Price("USD", "JPY", date(2022, 12, 1), Decimal("140")),
+        Price("JPY", "EUR", date(2023, 1, 1), Decimal("0.007")),
+        Price("AAPL", "USD", date(2023, 1, 1), Decimal("130")),
+        Price("GBP", "JPY", date(2023, 1, 1), Decimal(1000000) / 6643),
+    ]
+)
+CASH = Account("cash", "100", "現金", None, None)
+CARD = Account("card", "200", "未払金", None, None, "USD")
+SALES = Account("sales", "500", "売上高", None, None)
+
+
+def test_build_price_index() -> None:
+    """Test that prices are sorted and inverted into yen."""
+    assert PRICES == {
+        "USD": (
+            [date(2022, 12, 1), date(2023, 1, 30)],
+            [Decimal("140"), Decimal("150.55")],
+        ),
+        "EUR": ([date(2023, 1, 1)], [Decimal("142.857143")]),
+        "GBP": ([date(2023, 1, 1)], [Decimal("150.534397")]),
+    }
+
+
+@pytest.mark.parametrize(
+    "on, price_date",
+    [
+        (date(2023, 1, 29), date(2022, 12, 1)),
+        (date(2023, 1, 30), date(2023, 1, 30)),
+        (date(2023, 12, 31), date(2023, 1, 30)),
+    ],
+)
+def test_find_rate(on: date, price_date: date) -> None:
+    """Test that the latest price on or before a date is found."""
+    assert currency.find_rate(PRICES, "USD", on)[0] == price_date
+
+
+def test_find_rate_missing() -> None:
+    """Test that converting without an earlier price fails."""
+    with pytest.raises(ValueError):
+        currency.find_rate(PRICES, "USD", date(2022, 1, 1))
+    with pytest.raises(ValueError):
+        currency.find_rate(PRICES, "CHF", date(2023, 1, 1))
+
+
+def test_convert_to_yen() -> None:
+    """Test that converted transactions stay balanced."""
+    transaction = Transaction("tx", date(2023, 1, 31), "Sale", "USD")
+    splits = [
+        Split("a", CASH, transaction, None, Decimal("2.00")),
+        Split("b", SALES, transaction, None, Decimal("-1.00")),
+        Split("c", SALES, transaction, None, Decimal("-1.00")),
+    ]
+    db_contents = DbContents(account_store={}, transaction_store={})
+    db_contents.transaction_splits["tx"] = splits
+    assert currency.convert_to_yen(db_contents, PRICES) == splits
+    # 301.10 rounds down, but -150.55 rounds up, twice
+    assert [split.value for split in splits] == [
+        Decimal(302),
+        Decimal(-151),
+        Decimal(-151),
+    ]
+    assert transaction.conversion == "USD 150.55 2023-01-30"
+
+
+def test_convert_to_yen_booked() -> None:
+    """Test that splits of yen accounts keep their booked yen amount."""
+    transaction = Transaction("tx", date(2023, 1, 31), "Lunch", "USD")
+    splits = [
+        Split(
+            "a", CASH, transaction, None, Decimal(10), quantity=Decimal(1480)
+        ),
+        Split(
+            "b", CARD, transaction, None, Decimal(-10), quantity=Decimal(-10)
+        ),
+    ]
+    db_contents = DbContents(account_store={}, transaction_store={})
+    db_contents.transaction_splits["tx"] = splits
+    currency.convert_to_yen(db_contents, PRICES)
+    # Not 1506 from the price, and the difference goes to the card
+    assert [split.value for split in splits] == [
+        Decimal(1480),
+        Decimal(-1480),
+    ]
+
+
+@pytest.mark.parametrize(
+    "rate, expected",
+    [
+        (Decimal("150.550000"), "150.55"),
+        (Decimal("140.0"), "140"),
+        (Decimal(1000000) / 6643, "150.534397"),
+    ],
+)
+def test_round_rate(rate: Decimal, expected: str) -> None:
+    """Test that rates in the memo are short."""
+    assert str(currency.round_rate(rate)) == expected
@@ -0,0 +1,190 @@
+"""Test db."""
+import shutil
+import sqlite3
+from dataclasses import (
+    replace,
+)
+from datetime import (
+    date,
+)
+from decimal import (
+    Decimal,
+)
+from pathlib import (
+    Path,
+)
+from typing import (
+    Iterator,
+)
+
+import pytest
+from gntoka import (
+    db,
+)
+from gntoka.types import (
+    AccountBalance,
+    Configuration,
+    DbContents,
+    Snapshot,
+)
+
+
+TEST_DATA = Path("test/data")
+TEST_CONFIG = Configuration(
+    gnucash_db=TEST_DATA / "journal.gnucash",
+    journal_out_csv=TEST_DATA / "journal.csv",
+    start_date=date(2023, 1, 1),
+    end_date=date(2023, 12, 31),
+    start_num=1,
+)
+CASH = "456dd925286c49f0a9702c4c972a2241"
+SUPPLEMENTARY_CASH = "59970ca88a2045e8bc35a67653235ffe"
+
+
+@pytest.fixture
+def con() -> Iterator[sqlite3.Connection]:
+    """Open the test GnuCash book."""
+    con = db.open_connection(TEST_CONFIG)
+    yield con
+    con.close()
+
+
+def test_get_account_subtrees(con: sqlite3.Connection) -> None:
+    """Test get_account_subtrees."""
+    assert db.get_account_subtrees(con, ["現金"]) == {
+        CASH,
+        SUPPLEMENTARY_CASH,
+    }
+    assert db.get_account_subtrees(con, ["現金:補助現金"]) == {
+        SUPPLEMENTARY_CASH,
+    }
+    with pytest.raises(ValueError):
+        db.get_account_subtrees(con, ["Expenses:Dining"])
+
+
+def test_get_transactions_by_accounts(con: sqlite3.Connection) -> None:
+    """Test get_transactions with an account filter."""
+    start, end = date(2023, 1, 1), date(2023, 12, 31)
+    assert len(db.get_transactions(con, start, end)) == 5
+    transactions = db.get_transactions(con, start, end, {SUPPLEMENTARY_CASH})
+    assert [tx.description for tx in transactions.values()] == [
+        "Supplementary"
+    ]
+
+
+def test_get_trial_balance(con: sqlite3.Connection) -> None:
+    """Test that splits are totalled by Kaikeio account."""
+    db_contents = DbContents(
+        account_store=db.get_accounts(con),
+        transaction_store=db.get_transactions(
+            con, TEST_CONFIG.start_date, TEST_CONFIG.end_date
+        ),
+    )
+    db.get_splits(con, db_contents)
+    assert db.get_trial_balance(con, []) == [
+        AccountBalance(
+            "0", "Root Account", "100", "現金", Decimal(7), Decimal(0)
+        ),
+        AccountBalance(
+            "0", "Root Account", "500", "売上高", Decimal(0), Decimal(8)
+        ),
+        AccountBalance("100", "現金", "1", "補助現金", Decimal(1), Decimal(0)),
+    ]
+
+
+def test_get_trial_balance_denominator(tmp_path: Path) -> None:
+    """Test that values are divided by their denominators."""
+    path = tmp_path / "journal.gnucash"
+    shutil.copyfile(TEST_CONFIG.gnucash_db, path)
+    con = db.open_connection(replace(TEST_CONFIG, gnucash_db=path))
+    # Mix denominators within the same accounts
+    con.execute(
+        "update splits set value_num = value_num * 100, "
+        "value_denom = value_denom * 100 where rowid % 2 = 0"
+    )
+    db_contents = DbContents(
+        account_store=db.get_accounts(con),
+        transaction_store=db.get_transactions(
+            con, TEST_CONFIG.start_date, TEST_CONFIG.end_date
+        ),
+    )
+    db.get_splits(con, db_contents)
+    assert [
+        (balance.supplementary_code, balance.debit, balance.credit)
+        for balance in db.get_trial_balance(con, [])
+    ] == [
+        ("100", Decimal(7), Decimal(0)),
+        ("500", Decimal(0), Decimal(8)),
+        ("1", Decimal(1), Decimal(0)),
+    ]
+    con.close()
+
+
+def test_get_prices(tmp_path: Path) -> None:
+    """Test that prices and transaction currencies are read."""
+    path = tmp_path / "journal.gnucash"
+    shutil.copyfile(TEST_CONFIG.gnucash_db, path)
+    con = db.open_connection(replace(TEST_CONFIG, gnucash_db=path))
+    con.execute(
+        "insert into commodities values "
+        "('usd', 'CURRENCY', 'USD', 'US Dollar', '840', 100, 1, '', '')"
+    )
+    con.execute(
+        "insert into prices select 'p', 'usd', guid, '2023-01-30 10:59:00', "
+        "'user:price', 'last', 15055, 100 from commodities "
+        "where mnemonic = 'JPY'"
+    )
+    con.execute("update transactions set currency_guid = 'usd'")
+    assert db.get_prices(con) == {
+        "USD": ([date(2023, 1, 30)], [Decimal("150.55")])
+    }
+    transactions = db.get_transactions(
+        con, TEST_CONFIG.start_date, TEST_CONFIG.end_date
+    )
+    assert {tx.currency for tx in transactions.values()} == {"USD"}
+    con.close()
+
+
+def test_get_slots(tmp_path: Path) -> None:
+    """Test that the named slots of exported objects are read."""
+    path = tmp_path / "journal.gnucash"
+    shutil.copyfile(TEST_CONFIG.gnucash_db, path)
+    con = db.open_connection(replace(TEST_CONFIG, gnucash_db=path))
+    con.executemany(
+        "insert into slots (obj_guid, name, slot_type, int64_val, string_val) "
+        "values (?, ?, ?, ?, ?)",
+        [
+            (CASH, "notes", 4, 0, "tokyo"),
+            ("f723833d9aab49349ed702ac8526549e", "cost-center", 1, 12, None),
+            ("16d66047fcb14b49800475597642f4c4", "notes", 4, 0, "osaka"),
+            ("not exported", "notes", 4, 0, "nagoya"),
+        ],
+    )
+    db_contents = DbContents(
+        account_store=db.get_accounts(con),
+        transaction_store=db.get_transactions(
+            con, TEST_CONFIG.start_date, TEST_CONFIG.end_date
+        ),
+    )
+    db.get_splits(con, db_contents)
+    assert db.get_slots(con, {"notes", "cost-center"}) == {
+        CASH: {"notes": "tokyo"},
+        "f723833d9aab49349ed702ac8526549e": {"cost-center": "12"},
+        "16d66047fcb14b49800475597642f4c4": {"notes": "osaka"},
+    }
+    assert db.get_slots(con, {"cost-center"}) == {
+        "f723833d9aab49349ed702ac8526549e": {"cost-center": "12"},
+    }
+    con.close()
+
+
+@pytest.mark.parametrize("snapshot", list(Snapshot))
+def test_open_connection_snapshot(snapshot: Snapshot) -> None:
+    """Test that every snapshot reads the same book."""
+    con = db.open_connection(replace(TEST_CONFIG, snapshot=snapshot))
+    start, end = TEST_CONFIG.start_date, TEST_CONFIG.end_date
+    transactions = db.get_transactions(con, start, end, {SUPPLEMENTARY_CASH})
+    assert [tx.description for tx in transactions.values()] == [
+        "Supplementary"
+    ]
+    con.close()
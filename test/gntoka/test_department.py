@@ -0,0 +1,114 @@
+"""Test department."""
+from datetime import (
+    date,
+)
+from decimal import (
+    Decimal,
+)
+
+import pytest
+from gntoka import (
+    department,
+    journal,
+)
+from gntoka.types import (
+    Account,
+    DbContents,
+    Department,
+    DepartmentRule,
+    Split,
+    Transaction,
+)
+
+
+CASH = Account("cash", "100", "現金", None, None)
+DINING = Account("dining", "301", "接待交際費", None, None)
+TOKYO = Department(code="1", name="東京", tag1="4")
+OSAKA = Department(code="2", name="大阪")
+RULE = DepartmentRule(
+    slot="cost-center",
+    departments={"tokyo": TOKYO, "osaka": OSAKA},
+    account_paths=("Expenses",),
+)
+DB_CONTENTS = DbContents(
+    account_store={"cash": CASH, "dining": DINING},
+    transaction_store={},
+    account_paths={"cash": "Assets:Cash", "dining": "Expenses:Dining"},
+)
+TRANSACTION = Transaction("tx", date(2023, 1, 31), "Lunch")
+
+
+def make_split(guid: str, account: Account, value: int) -> Split:
+    """Make a split of TRANSACTION."""
+    return Split(guid, account, TRANSACTION, None, Decimal(value))
+
+
+def test_deserialize_department_rule() -> None:
+    """Test that departments default to no department."""
+    rule = department.deserialize_department_rule(
+        {
+            "slot": "cost-center",
+            "account_paths": ["Expenses"],
+            "departments": {
+                "tokyo": {"code": 1, "name": "東京", "tag1": "4"},
+                "osaka": {"code": "2", "name": "大阪"},
+            },
+        }
+    )
+    assert rule == RULE
+    assert rule.default == department.NO_DEPARTMENT
+
+
+def test_find_department() -> None:
+    """Test that split slots come before transaction and account slots."""
+    index = department.compile_department_index([RULE], DB_CONTENTS)
+    assert set(index) == {"dining"}
+    split = make_split("split", DINING, 1)
+    slots = {"dining": {"cost-center": "tokyo"}}
+    assert department.find_department(index, slots, split) == TOKYO
+    slots["tx"] = {"cost-center": "osaka"}
+    assert department.find_department(index, slots, split) == OSAKA
+    slots["split"] = {"cost-center": "tokyo"}
+    assert department.find_department(index, slots, split) == TOKYO
+    assert department.find_department(index, {}, split) == RULE.default
+    cash = make_split("cash", CASH, -1)
+    assert department.find_department(index, slots, cash) is None
+    with pytest.raises(ValueError):
+        department.find_department(
+            index, {"split": {"cost-center": "nagoya"}}, split
+        )
+
+
+def test_build_journal_entries() -> None:
+    """Test that rows get the departments and tags of their splits."""
+    splits = [
+        make_split("a", DINING, 1),
+        make_split("b", DINING, 2),
+        make_split("c", DINING, 3),
+        make_split("d", CASH, -6),
+    ]
+    db_contents = DbContents(
+        account_store=DB_CONTENTS.account_store,
+        transaction_store={"tx": TRANSACTION},
+        account_paths=DB_CONTENTS.account_paths,
+        split_store={split.guid: split for split in splits},
+        slots={"a": {"cost-center": "tokyo"}, "b": {"cost-center": "osaka"}},
+    )
+    department.assign_departments([RULE], db_contents)
+    entries = journal.build_journal_entries(
+        iter([1]), splits, {}, aggregate=True
+    )
+    assert [
+        (
+            entry.debit_department_code,
+            entry.debit_department_name,
+            entry.credit_department_code,
+            entry.tag1,
+        )
+        for entry in entries
+    ] == [
+        ("1", "東京", "0", "4"),
+        ("2", "大阪", "0", "3"),
+        ("0", "", "0", "3"),
+        ("0", "", "0", "3"),
+    ]
@@ -0,0 +1,103 @@
+"""Test journal."""
+from dataclasses import (
+    replace,
+)
+from datetime import (
+    date,
+)
+from decimal import (
+    Decimal,
+)
+from itertools import (
+    count,
+)
+from typing import (
+    Optional,
+)
+
+from gntoka import (
+    journal,
+    serialize,
+    util,
+)
+from gntoka.types import (
+    Account,
+    Split,
+    Transaction,
+)
+
+
+CASH = Account("cash", "100", "現金", None, None)
+CARD = Account("card", "200", "未払金", "1", "カード")
+DINING = Account("dining", "301", "接待交際費", None, None)
+TRANSACTION = Transaction("tx", date(2023, 1, 31), "Card statement")
+
+
+def make_split(
+    guid: str, account: Account, value: int, memo: Optional[str] = None
+) -> Split:
+    """Make a split of TRANSACTION."""
+    return Split(guid, account, TRANSACTION, memo, Decimal(value))
+
+
+def test_aggregate_splits() -> None:
+    """Test that splits are combined by account."""
+    splits = [
+        make_split("a", DINING, 100, "Lunch"),
+        make_split("b", CASH, 50),
+        make_split("c", DINING, 200, "Dinner"),
+        make_split("d", DINING, 300, "Lunch"),
+    ]
+    combined = replace(
+        make_split("a", DINING, 600, "Lunch Dinner"),
+        combined_guids=("a", "c", "d"),
+    )
+    assert journal.aggregate_splits(splits) == [
+        combined,
+        make_split("b", CASH, 50),
+    ]
+
+
+def test_aggregate_splits_memo() -> None:
+    """Test that combined memos fit into the Kaikeio memo."""
+    splits = [
+        make_split(str(i), DINING, 100, f"ランチ{i:03}") for i in range(100)
+    ]
+    (split,) = journal.aggregate_splits(splits)
+    assert split.memo
+    assert util.length_sjis(split.memo) <= journal.memo_budget(TRANSACTION)
+
+
+def test_build_journal_entries_aggregate() -> None:
+    """Test that an aggregated transaction can become a simple entry."""
+    tx = [
+        make_split("a", DINING, 100),
+        make_split("b", DINING, 200),
+        make_split("c", CARD, -300),
+    ]
+    assert journal.count_journal_entries(tx) == 3
+    assert len(journal.build_journal_entries(count(1), tx, {})) == 3
+    (entry,) = journal.build_journal_entries(count(1), tx, {}, True)
+    assert entry.debit_amount == entry.credit_amount == Decimal(300)
+    assert entry.transaction_guid == "tx"
+    assert entry.split_guids == ("a", "b", "c")
+
+
+def test_build_journal_entries_aggregate_memo() -> None:
+    """Test that the memos of both sides of a simple entry fit together."""
+    tx = [make_split(str(i), DINING, 100, f"ランチ{i:03}") for i in range(40)]
+    tx.append(make_split("card", CARD, -4000, "カード明細" * 4 + "x" * 8))
+    (entry,) = journal.build_journal_entries(count(1), tx, {}, True)
+    row = serialize.serialize_journal_entry(entry, util.SjisLengths())
+    assert util.length_sjis(row["メモ"]) <= serialize.KAIKEIO_MEMO_LENGTH
+
+
+def test_build_journal_entries_memo() -> None:
+    """Test that memos are only cut when splits are aggregated."""
+    memo = "カード明細" * 10
+    tx = [
+        make_split("a", DINING, 100, memo),
+        make_split("b", CARD, -100, memo),
+    ]
+    (entry,) = journal.build_journal_entries(count(1), tx, {})
+    assert entry.supplementary_summary == f"{memo} {memo}"
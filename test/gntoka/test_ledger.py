@@ -0,0 +1,68 @@
+"""Test ledger."""
+from concurrent.futures import (
+    ThreadPoolExecutor,
+)
+from pathlib import (
+    Path,
+)
+from typing import (
+    List,
+)
+
+from gntoka import (
+    ledger,
+)
+
+
+def test_allocate_slip_numbers(tmp_path: Path) -> None:
+    """Test that slip numbers stay the same when exporting again."""
+    con = ledger.open_ledger(tmp_path / "slips.sqlite")
+    assert ledger.allocate_slip_numbers(con, ["a", "b"], 1337) == [1337, 1338]
+    assert ledger.allocate_slip_numbers(con, ["c", "b", "a"], 1) == [
+        1339,
+        1338,
+        1337,
+    ]
+    assert ledger.find_gaps(con) == []
+
+
+def test_find_gaps(tmp_path: Path) -> None:
+    """Test that skipped slip numbers are found."""
+    con = ledger.open_ledger(tmp_path / "slips.sqlite")
+    ledger.allocate_slip_numbers(con, ["a"], 1)
+    ledger.allocate_slip_numbers(con, ["b"], 10)
+    assert ledger.find_gaps(con) == [(2, 9)]
+
+
+def test_allocate_slip_numbers_concurrently(tmp_path: Path) -> None:
+    """Test that concurrent exports never share a slip number."""
+    path = tmp_path / "slips.sqlite"
+    ledger.open_ledger(path).close()
+
+    def export(run: int) -> List[int]:
+        con = ledger.open_ledger(path)
+        tx_guids = [f"{run}-{i}" for i in range(100)]
+        slip_numbers = ledger.allocate_slip_numbers(con, tx_guids, 1)
+        con.close()
+        return slip_numbers
+
+    with ThreadPoolExecutor(4) as executor:
+        runs = list(executor.map(export, range(8)))
+    slip_numbers = [slip_number for run in runs for slip_number in run]
+    assert sorted(slip_numbers) == list(range(1, 801))
+
+
+def test_preview_slip_numbers(tmp_path: Path) -> None:
+    """Test that previewing slip numbers leaves the ledger alone."""
+    path = tmp_path / "slips.sqlite"
+    con = ledger.open_ledger_read_only(path)
+    assert ledger.preview_slip_numbers(con, ["a", "b"], 1337) == [1337, 1338]
+    con.close()
+    assert not path.exists()
+    con = ledger.open_ledger(path)
+    ledger.allocate_slip_numbers(con, ["a"], 1)
+    con.close()
+    con = ledger.open_ledger_read_only(path)
+    assert ledger.preview_slip_numbers(con, ["b", "a", "c"], 1) == [2, 1, 3]
+    assert ledger.preview_slip_numbers(con, ["b"], 1) == [2]
+    con.close()
@@ -0,0 +1,64 @@
+"""Test provenance."""
+from datetime import (
+    date,
+)
+from pathlib import (
+    Path,
+)
+
+import pytest
+from gntoka import (
+    journal,
+    provenance,
+)
+from gntoka.types import (
+    JournalEntry,
+)
+
+
+TRANSACTION = "16d66047fcb14b49800475597642f4c4"
+
+
+def make_entry(slip: int, line: int, *split_guids: str) -> JournalEntry:
+    """Make a journal entry that came from some splits."""
+    return journal.make_journal_entry(
+        slip_number=slip,
+        line_number=line,
+        slip_date=date(2023, 1, 31),
+        debit_account=None,
+        credit_account=None,
+        debit_amount=None,
+        credit_amount=None,
+        description=None,
+        description_supplementary=None,
+        transaction_guid=TRANSACTION,
+        split_guids=split_guids,
+    )
+
+
+def test_lookup(tmp_path: Path) -> None:
+    """Test finding the splits of rows, whatever order they were written in."""
+    path = tmp_path / "journal.idx"
+    entries = [
+        make_entry(1338, 2, "c" * 32),
+        make_entry(1338, 1, "a" * 32, "b" * 32),
+        make_entry(1337, 1, "d" * 32),
+        make_entry(70000, 1, "e" * 32),
+    ]
+    provenance.write_index(path, entries)
+    assert provenance.lookup(path, 1338, 1) == [
+        (TRANSACTION, "a" * 32),
+        (TRANSACTION, "b" * 32),
+    ]
+    assert provenance.lookup(path, 1338, 2) == [(TRANSACTION, "c" * 32)]
+    assert provenance.lookup(path, 70000, 1) == [(TRANSACTION, "e" * 32)]
+    assert provenance.lookup(path, 1338, 3) == []
+    assert provenance.lookup(path, 1, 1) == []
+
+
+def test_lookup_not_an_index(tmp_path: Path) -> None:
+    """Test that other files are rejected."""
+    path = tmp_path / "journal.csv"
+    path.write_text("伝票番号,行番号\r\n", encoding="shift_jis")
+    with pytest.raises(ValueError):
+        provenance.lookup(path, 1, 1)
@@ -0,0 +1,128 @@
+"""Test reconcile."""
+import csv
+from datetime import (
+    date,
+)
+from pathlib import (
+    Path,
+)
+from typing import (
+    List,
+)
+
+import pytest
+from gntoka import (
+    reconcile,
+)
+from gntoka.csv import (
+    KaikeoDialect,
+)
+from gntoka.serialize import (
+    journal_entry_columns,
+)
+from gntoka.types import (
+    CsvRow,
+    Reconciliation,
+    RowChange,
+)
+
+
+def make_row(slip: int, line: int, amount: int) -> CsvRow:
+    """Make a journal row."""
+    row = {column: "" for column in journal_entry_columns}
+    row.update(
+        {
+            "伝票番号": str(slip),
+            "行番号": str(line),
+            "伝票日付": "2023/01/31",
+            "借方金額": str(amount),
+            "貸方金額": str(amount),
+            "メモ": "2023-02-01",
+        }
+    )
+    return row
+
+
+def write_rows(path: Path, rows: List[CsvRow]) -> None:
+    """Write rows like Kaikeio exports them."""
+    with path.open("w", encoding="shift_jis", newline="") as fd:
+        writer = csv.DictWriter(
+            fd, journal_entry_columns, dialect=KaikeoDialect
+        )
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+journal = [make_row(1, 1, 100), make_row(2, 1, 200), make_row(3, 1, 300)]
+START_DATE = date(2023, 1, 1)
+END_DATE = date(2023, 1, 31)
+
+
+def test_reconcile_same(tmp_path: Path) -> None:
+    """Test that the memo is not compared."""
+    path = tmp_path / "kaikeio.csv"
+    write_rows(path, [{**row, "メモ": "2023-03-01"} for row in journal])
+    assert (
+        reconcile.reconcile(journal, path, START_DATE, END_DATE)
+        == Reconciliation()
+    )
+
+
+@pytest.mark.parametrize("bucket_memory", [reconcile.BUCKET_MEMORY, 2048])
+def test_reconcile(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, bucket_memory: int
+) -> None:
+    """Test finding missing, extra and changed rows."""
+    monkeypatch.setattr(reconcile, "BUCKET_MEMORY", bucket_memory)
+    path = tmp_path / "kaikeio.csv"
+    changed = make_row(1, 1, 101)
+    renumbered = make_row(7, 1, 200)
+    extra = make_row(9, 1, 900)
+    write_rows(path, [changed, renumbered, extra])
+    assert reconcile.reconcile(
+        journal, path, START_DATE, END_DATE
+    ) == Reconciliation(
+        missing=[journal[2]],
+        extra=[extra],
+        changed=[
+            RowChange(journal[0], changed, ["借方金額", "貸方金額"]),
+            RowChange(journal[1], renumbered, ["伝票番号"]),
+        ],
+    )
+
+
+def test_reconcile_duplicate(tmp_path: Path) -> None:
+    """Test that a row imported twice is reported."""
+    path = tmp_path / "kaikeio.csv"
+    write_rows(path, journal + [journal[0]])
+    assert reconcile.reconcile(
+        journal, path, START_DATE, END_DATE
+    ) == Reconciliation(extra=[journal[0]])
+
+
+def test_reconcile_period(tmp_path: Path) -> None:
+    """Test that Kaikeio rows outside the exported period are ignored."""
+    path = tmp_path / "kaikeio.csv"
+    write_rows(path, journal + [{**make_row(9, 1, 900), "伝票日付": "2023/02/01"}])
+    assert reconcile.reconcile(journal, path, START_DATE, END_DATE) == (
+        Reconciliation()
+    )
+
+
+def test_count_buckets(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test that buckets are sized by the memory rows take."""
+    path = tmp_path / "kaikeio.csv"
+    write_rows(path, journal)
+    assert reconcile.count_buckets(path) == 1
+    monkeypatch.setattr(reconcile, "BUCKET_MEMORY", reconcile.ROW_MEMORY)
+    assert reconcile.count_buckets(path) == 4
+
+
+def test_read_kaikeio_csv(tmp_path: Path) -> None:
+    """Test that other CSV files are rejected."""
+    path = tmp_path / "kaikeio.csv"
+    path.write_text("a,b\r\n1,2\r\n", encoding="shift_jis")
+    with pytest.raises(ValueError):
+        list(reconcile.read_kaikeio_csv(path))
@@ -0,0 +1,115 @@
+"""Test serialize."""
+from dataclasses import (
+    replace,
+)
+from datetime import (
+    date,
+)
+from decimal import (
+    Decimal,
+)
+from typing import (
+    Any,
+    Dict,
+)
+
+import pytest
+from gntoka import (
+    journal,
+    serialize,
+)
+from gntoka.types import (
+    Account,
+    ConsumptionTaxRate,
+    JournalEntry,
+)
+from gntoka.util import (
+    SjisLengths,
+)
+
+
+@pytest.fixture
+def entry() -> JournalEntry:
+    """Build a simple journal entry."""
+    return journal.make_journal_entry(
+        slip_number=1337,
+        line_number=1,
+        slip_date=date(2023, 1, 31),
+        debit_account=Account("debit", "100", "現金", "1", "補助現金"),
+        credit_account=None,
+        debit_amount=Decimal(1000),
+        credit_amount=None,
+        description="Description",
+        description_supplementary=None,
+    )
+
+
+def test_serialize_journal_entry(entry: JournalEntry) -> None:
+    """Test serialize_journal_entry."""
+    result = serialize.serialize_journal_entry(entry, SjisLengths())
+    assert tuple(result) == serialize.journal_entry_columns
+    assert len(serialize.journal_entry_columns) == 33
+    assert result["伝票番号"] == "1337"
+    assert result["伝票日付"] == "2023/01/31"
+    assert result["借方補助科目名称"] == "補助現金"
+    assert result["借方金額"] == "1000"
+    assert result["貸方科目コード"] == "0"
+    assert result["貸方金額"] == "0"
+    assert result["借方消費税率"] == "0%"
+    assert result["摘要"] == "Description"
+
+
+def test_serialize_journal_entry_overflow(entry: JournalEntry) -> None:
+    """Test that long summaries are added to the memo."""
+    entry = replace(
+        entry,
+        summary="A very long description",
+        supplementary_summary="Short",
+        memo="Memo",
+    )
+    result = serialize.serialize_journal_entry(entry, SjisLengths())
+    assert result["摘要"] == "A very long des"
+    assert result["補助摘要"] == "Short"
+    assert result["メモ"] == "A very long description Memo"
+
+
+def test_serialize_journal_entry_lengths(entry: JournalEntry) -> None:
+    """Test that only names are cached in lengths."""
+    entry = replace(
+        entry,
+        debit_name="現金" * 7 + "ab",
+        summary="摘要" * 10,
+        memo="memo" * 20,
+    )
+    lengths = SjisLengths()
+    serialize.serialize_journal_entry(entry, lengths)
+    assert lengths == {"現金" * 7 + "ab": 30}
+
+
+def test_serialize_journal_entry_tax_rate(entry: JournalEntry) -> None:
+    """Test consumption tax rate serialization."""
+    entry = replace(
+        entry, debit_consumption_tax_rate=ConsumptionTaxRate.EIGHT_REDUCED
+    )
+    result = serialize.serialize_journal_entry(entry, SjisLengths())
+    assert result["借方消費税率"] == "8%軽"
+
+
+@pytest.mark.parametrize(
+    "changes",
+    [
+        {"slip_number": 10_000_000},
+        {"line_number": 0},
+        {"debit_name": "金" * 16},
+        {"credit_amount": Decimal(10_000_000_000)},
+        {"memo": "メモ" * 101},
+    ],
+)
+def test_serialize_journal_entry_limits(
+    entry: JournalEntry, changes: Dict[str, Any]
+) -> None:
+    """Test that Kaikeio's limits are enforced."""
+    with pytest.raises(AssertionError):
+        serialize.serialize_journal_entry(
+            replace(entry, **changes), SjisLengths()
+        )
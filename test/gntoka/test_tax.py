@@ -0,0 +1,101 @@
+"""Test tax."""
+from datetime import (
+    date,
+)
+from decimal import (
+    Decimal,
+)
+
+import pytest
+from gntoka import (
+    tax,
+)
+from gntoka.types import (
+    Account,
+    ConsumptionTaxRate,
+    DbContents,
+    Split,
+    TaxRule,
+    Transaction,
+)
+
+
+CASH = Account("cash", "100", "現金", None, None)
+DINING = Account("dining", "301", "接待交際費", None, None)
+FOOD = Account("food", "301", "接待交際費", "1", "食品")
+EIGHT = TaxRule(
+    tax_class="1",
+    rate=ConsumptionTaxRate.EIGHT_REDUCED,
+    account_guids=("food",),
+    start_date=date(2019, 10, 1),
+)
+TEN = TaxRule(
+    tax_class="1",
+    rate=ConsumptionTaxRate.TEN,
+    account_paths=("Expenses:Dining",),
+    start_date=date(2019, 10, 1),
+    end_date=date(2029, 12, 31),
+)
+DB_CONTENTS = DbContents(
+    account_store={"cash": CASH, "dining": DINING, "food": FOOD},
+    transaction_store={},
+    account_paths={
+        "cash": "Assets:Cash",
+        "dining": "Expenses:Dining",
+        "food": "Expenses:Dining:Food",
+    },
+)
+
+
+def test_compile_tax_index() -> None:
+    """Test that the first matching rule applies."""
+    index = tax.compile_tax_index([EIGHT, TEN], DB_CONTENTS)
+    assert set(index) == {"dining", "food"}
+    assert tax.find_tax_rule(index, "cash", date(2023, 1, 1)) is None
+    assert tax.find_tax_rule(index, "dining", date(2019, 9, 30)) is None
+    assert tax.find_tax_rule(index, "dining", date(2019, 10, 1)) == TEN
+    assert tax.find_tax_rule(index, "dining", date(2029, 12, 31)) == TEN
+    assert tax.find_tax_rule(index, "dining", date(2030, 1, 1)) is None
+    assert tax.find_tax_rule(index, "food", date(2019, 10, 1)) == EIGHT
+    assert tax.find_tax_rule(index, "food", date(2030, 1, 1)) == EIGHT
+
+
+def test_compile_tax_index_by_code() -> None:
+    """Test matching accounts by Kaikeio code."""
+    rule = TaxRule(
+        tax_class="1", rate=ConsumptionTaxRate.TEN, account_codes=("301",)
+    )
+    index = tax.compile_tax_index([rule], DB_CONTENTS)
+    assert index == {
+        "dining": ([date.min], [rule]),
+        "food": ([date.min], [rule]),
+    }
+
+
+@pytest.mark.parametrize(
+    "amount, rate, expected",
+    [
+        (Decimal(1100), ConsumptionTaxRate.TEN, Decimal(100)),
+        (Decimal(1000), ConsumptionTaxRate.TEN, Decimal(90)),
+        (Decimal(1080), ConsumptionTaxRate.EIGHT_REDUCED, Decimal(80)),
+        (Decimal(1000), ConsumptionTaxRate.ZERO, Decimal(0)),
+    ],
+)
+def test_calculate_consumption_tax(
+    amount: Decimal, rate: ConsumptionTaxRate, expected: Decimal
+) -> None:
+    """Test calculate_consumption_tax."""
+    assert tax.calculate_consumption_tax(amount, rate) == expected
+
+
+def test_find_consumption_tax() -> None:
+    """Test find_consumption_tax."""
+    index = tax.compile_tax_index([TEN], DB_CONTENTS)
+    transaction = Transaction("tx", date(2023, 1, 31), "Dinner")
+    consumption_tax = tax.find_consumption_tax(
+        index, Split("split", DINING, transaction, None, Decimal(-2200))
+    )
+    assert consumption_tax is not None
+    assert consumption_tax.rate == ConsumptionTaxRate.TEN
+    assert consumption_tax.amount == Decimal(200)
+    assert tax.find_consumption_tax(index, None) is None
@@ -23,3 +23,45 @@ def test_clean_text() -> None:
 def test_length_sjis(txt: str, length: int) -> None:
     """Test lengt_sjis."""
     assert util.length_sjis(txt) == length
+
+
+@pytest.mark.parametrize(
+    "txt, max_length, fits",
+    [
+        ("A" * 30, 30, True),
+        ("A" * 31, 30, False),
+        ("金" * 15, 30, True),
+        ("金" * 16, 30, False),
+    ],
+)
+def test_fits_sjis(txt: str, max_length: int, fits: bool) -> None:
+    """Test fits_sjis."""
+    assert util.fits_sjis(txt, max_length, util.SjisLengths()) == fits
+
+
+@pytest.mark.parametrize(
+    "txt, max_length, truncated",
+    [
+        ("A" * 31, 30, "A" * 30),
+        ("金" * 16, 30, "金" * 15),
+        ("A" + "金" * 15, 30, "A" + "金" * 14),
+    ],
+)
+def test_truncate_sjis(txt: str, max_length: int, truncated: str) -> None:
+    """Test truncate_sjis."""
+    assert util.truncate_sjis(txt, max_length) == truncated
+
+
+def test_clean_texts() -> None:
+    """Test clean_texts."""
+    texts = util.clean_texts(["hello\xa0", "ヴ", "ヴ", "", None])
+    assert texts == {"hello\xa0": "hello ", "ヴ": "ｳﾞ"}
+    assert texts.get("") is None
+    assert texts.get(None) is None
+
+
+def test_sjis_lengths() -> None:
+    """Test SjisLengths."""
+    lengths = util.SjisLengths()
+    assert lengths["金" * 15] == 30
+    assert lengths == {"金" * 15: 30}
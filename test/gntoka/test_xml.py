@@ -0,0 +1,130 @@
+"""Test xml."""
+from datetime import (
+    date,
+)
+from decimal import (
+    Decimal,
+)
+from pathlib import (
+    Path,
+)
+from xml.etree.ElementTree import (
+    fromstring,
+)
+
+import pytest
+from gntoka import (
+    db,
+    xml,
+)
+from gntoka.types import (
+    Configuration,
+    DbContents,
+    Price,
+)
+
+
+TEST_DATA = Path("test/data")
+START_DATE = date(2023, 1, 1)
+END_DATE = date(2023, 12, 31)
+
+
+def test_is_xml_book() -> None:
+    """Test is_xml_book."""
+    assert xml.is_xml_book(TEST_DATA / "journal-xml.gnucash")
+    assert not xml.is_xml_book(TEST_DATA / "journal.gnucash")
+
+
+def test_read_book() -> None:
+    """Test that XML and SQLite books give the same contents."""
+    contents = xml.read_book(
+        TEST_DATA / "journal-xml.gnucash", START_DATE, END_DATE
+    )
+    con = db.open_connection(
+        Configuration(
+            gnucash_db=TEST_DATA / "journal.gnucash",
+            journal_out_csv=TEST_DATA / "journal.csv",
+            start_date=START_DATE,
+            end_date=END_DATE,
+            start_num=1,
+        )
+    )
+    expected = DbContents(
+        account_store=db.get_accounts(con),
+        transaction_store=db.get_transactions(con, START_DATE, END_DATE),
+    )
+    db.get_splits(con, expected)
+    con.close()
+    assert contents.account_store == expected.account_store
+    assert contents.transaction_store == expected.transaction_store
+    assert contents.split_store == expected.split_store
+    assert len(contents.transaction_splits) == 5
+
+
+def test_read_book_filtered() -> None:
+    """Test filtering by date and account."""
+    path = TEST_DATA / "journal-xml.gnucash"
+    assert not xml.read_book(path, date(2023, 2, 1), END_DATE).split_store
+    contents = xml.read_book(path, START_DATE, END_DATE, ["現金:補助現金"])
+    assert [tx.description for tx in contents.transaction_store.values()] == [
+        "Supplementary"
+    ]
+    with pytest.raises(ValueError):
+        xml.read_book(path, START_DATE, END_DATE, ["Expenses:Dining"])
+
+
+@pytest.mark.parametrize(
+    "posted, expected",
+    [
+        ("2023-01-31 10:59:00 +0000", "2023-01-31 10:59:00"),
+        ("2023-02-01 00:00:00 +0900", "2023-01-31 15:00:00"),
+    ],
+)
+def test_parse_post_date(posted: str, expected: str) -> None:
+    """Test parse_post_date."""
+    element = fromstring(
+        '<gnc:transaction xmlns:gnc="http://www.gnucash.org/XML/gnc" '
+        'xmlns:trn="http://www.gnucash.org/XML/trn" '
+        'xmlns:ts="http://www.gnucash.org/XML/ts">'
+        f"<trn:date-posted><ts:date>{posted}</ts:date></trn:date-posted>"
+        "</gnc:transaction>"
+    )
+    assert xml.parse_post_date(element) == expected
+
+
+def test_parse_price() -> None:
+    """Test parse_price."""
+    element = fromstring(
+        '<price xmlns:price="http://www.gnucash.org/XML/price" '
+        'xmlns:cmdty="http://www.gnucash.org/XML/cmdty" '
+        'xmlns:ts="http://www.gnucash.org/XML/ts">'
+        "<price:commodity><cmdty:space>CURRENCY</cmdty:space>"
+        "<cmdty:id>USD</cmdty:id></price:commodity>"
+        "<price:currency><cmdty:space>CURRENCY</cmdty:space>"
+        "<cmdty:id>JPY</cmdty:id></price:currency>"
+        "<price:time><ts:date>2023-01-30 10:59:00 +0000</ts:date></price:time>"
+        "<price:value>15055/100</price:value>"
+        "</price>"
+    )
+    assert xml.parse_price(element) == Price(
+        "USD", "JPY", date(2023, 1, 30), Decimal("150.55")
+    )
+
+
+def test_read_slots() -> None:
+    """Test that only the named slots are read."""
+    element = fromstring(
+        '<gnc:account xmlns:gnc="http://www.gnucash.org/XML/gnc" '
+        'xmlns:act="http://www.gnucash.org/XML/act" '
+        'xmlns:slot="http://www.gnucash.org/XML/slot">'
+        "<act:slots>"
+        "<slot><slot:key>notes</slot:key>"
+        '<slot:value type="string">tokyo</slot:value></slot>'
+        "<slot><slot:key>placeholder</slot:key>"
+        '<slot:value type="string">true</slot:value></slot>'
+        "</act:slots>"
+        "</gnc:account>"
+    )
+    slots = {"other": {"notes": "osaka"}}
+    xml.read_slots(element, f"{xml.ACT}slots/slot", "cash", {"notes"}, slots)
+    assert slots == {"other": {"notes": "osaka"}, "cash": {"notes": "tokyo"}}